@@ -32,7 +32,6 @@ warnings.filterwarnings('ignore')
 
 import cartopy.crs as ccrs
 import matplotlib.pyplot as plt
-import cartopy.feature as cfeature
 from satpy import Scene
 import glob
 
@@ -40,7 +39,14 @@ import glob
 # In[3]:
 
 
+from hsd_roi import select_segments
+
+# Area of interest (South East Asia): lon_min, lat_min, lon_max, lat_max
+bbox = (80, 20, 140, 45)
+
+# Only the HSD segments (10 per full disk) that intersect the area are read
 files = glob.glob(r'/Users/macbookairdemilo/Desktop/data_HIMAWARI/202312170010/*.DAT') 
+files = select_segments(files, bbox)
 
 
 # ## Create readers and open files.
@@ -58,6 +64,8 @@ scn = Scene(filenames=files,  reader='ahi_hsd',filter_parameters={'start_time':
 
 
 scn.load(["B01"])
+# Crop before anything is computed: only the rows of the area are decoded
+roi = scn.crop(ll_bbox=bbox)
 
 
 # In[6]:
@@ -80,11 +88,13 @@ plt.show()
 # In[8]:
 
 
-country_borders = cfeature.NaturalEarthFeature(
-    category='cultural',
-    name='‘admin_0_boundary_lines_land',
-    scale='50m',
-    facecolor='none')
+# Natural Earth borders and coastline of the region, read once and cached on disk
+# (geometry_cache.py), so later plots also work offline
+from geometry_cache import natural_earth
+
+extent = (bbox[0], bbox[2], bbox[1], bbox[3])
+country_borders = natural_earth('cultural', 'admin_0_boundary_lines_land', '50m', extent)
+coastline = natural_earth('physical', 'coastline', '50m', extent)
 
 
 # ## Resample from Satellite Imagery and save resampled datasets to current directory.
@@ -97,14 +107,16 @@ country_borders = cfeature.NaturalEarthFeature(
 # In[9]:
 
 """
-cropped_scn_aus = scn.crop(ll_bbox=(80, 20, 140, 45))
-remapped_scn_aus = cropped_scn_aus.resample(resampler='native')
+# Nearest-neighbour lookup table of the (cropped area, target area) pair, computed
+# once and cached on disk (resample_cache.py): later slots only gather the pixels
+from resample_cache import resample_scene, target_area
+remapped_scn_aus = resample_scene(roi, target_area(bbox), 'nearest')
 
 ccrs= remapped_scn_aus["B01"].attrs['area'].to_cartopy_crs()
 ax=plt.axes(projection=ccrs)
 
-ax.add_feature(cfeature.BORDERS)
-ax.add_feature(cfeature.COASTLINE)
+ax.add_feature(country_borders)
+ax.add_feature(coastline)
 
 ax.gridlines()
 ax.set_global()
@@ -137,21 +149,46 @@ scn.available_composite_names()
 # In[12]:
 
 
+# Several satpy composites of the slot are best loaded in one scn.load([...]) call, which
+# reads their shared bands once. The numpy recipes of composite_planner.py share them
+# through the band cache, across runs too:
+# python composite_planner.py 'data_HIMAWARI/202312170010/*.DAT' -p true_color airmass dust water_vapour dvorak --bbox 80 20 140 45 -o out/
 scn.load(['water_vapors1'])
+roi = scn.crop(ll_bbox=bbox)
 
 
 # In[13]:
 
 
-scn.save_dataset('water_vapors1', 'water_vapors1.png')
+roi.save_dataset('water_vapors1', 'water_vapors1.png')
 
 
 # In[14]:
 
 
-image = plt.imread('water_vapors1.png') 
+# Image enhanced as in the PNG, without reading the PNG back
+# (every slot of data_HIMAWARI: python himawari_pipeline.py data_HIMAWARI -p water_vapors1 --bbox 80 20 140 45 -o out/)
+from himawari_pipeline import to_image
+image = to_image(roi['water_vapors1'])
 plt.imshow(image)
 cbar=plt.colorbar()
 cbar.set_label("Kelvin")
 plt.show()
 
+
+# In[15]:
+
+
+# Dvorak BD enhancement applied directly to the B13 temperatures (K) of a storm-centred
+# window, through a temperature-indexed table (dvorak.py): no PNG/JPEG in between
+from dvorak import dvorak_frame
+from scheme_registry import get_registry
+
+get_registry().add_path('.')    # BD.csv
+# All the segments of the slot: the window is outside the South East Asia box
+slot = glob.glob(r'/Users/macbookairdemilo/Desktop/data_HIMAWARI/202312170010/*.DAT')
+bd = dvorak_frame(slot, (130.0, 8.0), 'BD', radius_km=500)
+plt.imshow(bd)
+plt.show()
+# Every slot, with the window following the best-track centre (storm_track.py):
+# python dvorak.py data_HIMAWARI -s BD --scheme-path BD.csv --track bst_all.txt --storm 2317 -o bd.gif
@@ -12,29 +12,22 @@
 # Image
 
 import numpy as np
-from PIL import Image
 import matplotlib.pyplot as plt
+from enhancement import linear_reg, get_lut, apply_lut, load_image, save_image
+from scheme_registry import get_registry, read_scheme
 
 fileorg = 'se1_b03_0410'
-img_org = Image.open(fileorg+'.jpg')
-
-nx,ny = np.size(img_org)
-pic_org = img_org.load()
-r2pix = np.zeros([nx,ny],'uint8')
-for ix in range(nx):
-    for iy in range(ny):
-        r2pix[ix,iy] = pic_org[ix,iy][1]
+# Decoded image, row-major (rows, cols, 3), and a view of its green channel
+rgb = load_image(fileorg+'.jpg')
+r2pix = rgb[...,1]
 
 
 # In[2]:
 
 
-# Fonction to estimate the coefficient of a linear line
-
-def linear_reg(x1,x2,y1,y2):
-    a = (y2-y1)/float(x2-x1)
-    b = y1 - a*x1
-    return a,b
+# Fonction to estimate the coefficient of a linear line: see enhancement.linear_reg
+# Every scheme below is compiled once into a 256-entry lookup table (enhancement.py)
+# and applied to the whole image in a single gather.
 
 
 # ## 1/ Linear shifting
@@ -66,14 +59,9 @@ plt.show()
 # In[4]:
 
 
-ln_up = np.zeros([nx,ny],'uint8')
+ln_up = apply_lut(r2pix, get_lut('ln_up'))
     # uint8: Unsigned integer (0 to 255)
-for ix in range(nx):
-    for iy in range(ny):
-        ln_up[ix,iy] = min(255,r2pix[ix,iy]+50)
-ln_up = np.rollaxis(ln_up,0,2)
-img_up = Image.fromarray(ln_up)
-img_up.save(fileorg+'_ln_up.jpg')
+save_image(ln_up, fileorg+'_ln_up.jpg')
 
 photo = plt.imread(fileorg+'_ln_up.jpg')
 plt.imshow(photo, cmap='gray', vmin = 0, vmax = 255)
@@ -114,16 +102,8 @@ plt.show()
 
 # More contrast
 
-a,b = linear_reg(75,100,0,255)
-img_plus = np.zeros([nx,ny],'uint8')
-for ix in range(nx):
-    for iy in range(ny):
-        img_plus_tmp = int(a*r2pix[ix,iy]+b)
-        img_plus[ix,iy] = min(255,max(0,img_plus_tmp))
-        
-img_plus = np.rollaxis(img_plus,0,2)
-img_out_plus = Image.fromarray(img_plus)
-img_out_plus.save(fileorg+'_more_contrast.jpg')
+img_plus = apply_lut(r2pix, get_lut('more_contrast'))
+save_image(img_plus, fileorg+'_more_contrast.jpg')
 
 photo = plt.imread(fileorg+'_more_contrast.jpg')
 plt.imshow(photo, cmap='gray', vmin = 0, vmax = 255)
@@ -134,16 +114,8 @@ plt.imshow(photo, cmap='gray', vmin = 0, vmax = 255)
 
 # Less contrast
 
-a1,b1 = linear_reg(0,255,75,100)
-img_plus = np.zeros([nx,ny],'uint8')
-for ix in range(nx):
-    for iy in range(ny):
-        img_plus_tmp = int(a1*r2pix[ix,iy]+b1)
-        img_plus[ix,iy] = min(255,max(0,img_plus_tmp))
-        
-img_plus = np.rollaxis(img_plus,0,2)
-img_out_plus = Image.fromarray(img_plus)
-img_out_plus.save(fileorg+'_less_contrast.jpg')
+img_plus = apply_lut(r2pix, get_lut('less_contrast'))
+save_image(img_plus, fileorg+'_less_contrast.jpg')
 
 photo = plt.imread(fileorg+'_less_contrast.jpg')
 plt.imshow(photo, cmap='gray', vmin = 0, vmax = 255)
@@ -156,8 +128,9 @@ plt.imshow(photo, cmap='gray', vmin = 0, vmax = 255)
 # In[8]:
 
 
-x = [0,50,100,200,225,255]
-y = [0,0,100,200,255,255]
+# Breakpoints of the ZA scheme (data/schemes/ZA.txt)
+registry = get_registry()
+kind, (x, y) = read_scheme(registry.find('ZA'))
 
 fig, ax = plt.subplots(figsize=(5,5))
 plt.plot(x,x,'k')
@@ -175,17 +148,8 @@ plt.show()
 # In[9]:
 
 
-img_za = np.zeros([nx,ny],'uint8')
-for ix in range(nx):
-    for iy in range(ny):
-        i=0
-        while (r2pix[ix,iy] >= x[i]) and (i < len(x)-1):
-            i = i+1
-        a,b = linear_reg(x[i-1],x[i],y[i-1],y[i])
-        img_za[ix,iy] = min(max(int(a*r2pix[ix,iy]+b),0),255)
-img_za = np.rollaxis(img_za,0,2)
-img_out = Image.fromarray(img_za)
-img_out.save(fileorg+'_ZA.jpg')
+img_za = apply_lut(r2pix, registry.get('ZA'))
+save_image(img_za, fileorg+'_ZA.jpg')
 photo = plt.imread(fileorg+'_ZA.jpg')
 plt.imshow(photo, cmap='gray', vmin=0, vmax=255)
 
@@ -197,8 +161,8 @@ plt.imshow(photo, cmap='gray', vmin=0, vmax=255)
 # In[10]:
 
 
-x = [0,50,100,170,170,185,185,200,200,205,210,225,255]
-y = [0,0,100,170,120,120,160,160,75,75,0,255,255]
+# Breakpoints of the MB scheme (data/schemes/MB.txt)
+kind, (x, y) = read_scheme(registry.find('MB'))
 
 fig, ax = plt.subplots(figsize=(5,5))
 plt.plot(x,x,'k')
@@ -216,17 +180,8 @@ plt.show()
 # In[11]:
 
 
-img_mb = np.zeros([nx,ny],'uint8')
-for ix in range(nx):
-    for iy in range(ny):
-        i=0
-        while (r2pix[ix,iy] >= x[i]) and (i < len(x)-1):
-            i = i+1
-        a,b = linear_reg(x[i-1],x[i],y[i-1],y[i])
-        img_mb[ix,iy] = min(max(int(a*r2pix[ix,iy]+b),0),255)
-img_mb = np.rollaxis(img_mb,0,2)
-img_out = Image.fromarray(img_mb)
-img_out.save(fileorg+'_MB.jpg')
+img_mb = apply_lut(r2pix, registry.get('MB'))
+save_image(img_mb, fileorg+'_MB.jpg')
 photo = plt.imread(fileorg+'_MB.jpg')
 plt.imshow(photo, cmap='gray', vmin=0, vmax=255)
 
@@ -238,73 +193,14 @@ plt.imshow(photo, cmap='gray', vmin=0, vmax=255)
 # In[ ]:
 
 
-# Read enhancement scheme from text file
-x1 = []
-x2 = []
-yb1 = []
-yb2 = []
-yg1 = []
-yg2 = []
-yr1 = []
-yr2 = []
-schemename = 'BD.txt'
-f = open(schemename,'r')
-lines = f.readlines()
-nline = 0
-for line in lines:
-    nline+=1
-    if nline<=0:
-        continue
-    else:
-        temp = line.split()
-        x1 = np.append(x1,int(temp[0]))
-        x2 = np.append(x2,int(temp[1]))
-        yb1 = np.append(yb1,int(temp[2]))
-        yb2 = np.append(yb2,int(temp[3]))
-        yg1 = np.append(yg1,int(temp[4]))
-        yg2 = np.append(yg2,int(temp[5]))
-        yr1 = np.append(yr1,int(temp[6]))
-        yr2 = np.append(yr2,int(temp[7]))
-x = []
-yb = []
-for i in range(b,len(x1)):
-    x = np.append(x,x1[i])
-    x = np.append(x,x2[i])
-    yb = np.append(yb,yb1[i])
-    yb = np.append(yb,yb2[i])
-
-fig, ax = plt.subplots(figsize=(5,5))
-plt.plot(x,x,'k')
-plt.plot(x,yb,'b')
-plt.title('BD scheme',fontsize=16)
-plt.ylabel('Out',fontsize=14)
-plt.xlabel('In',fontsize=14)
-plt.grid(True,dashes=(1,2,1,2))
-plt.show()
-
-
-# In[30]:
-
-
-import pandas as pd
-BD = pd.read_csv('BD.csv',sep=';')
-x1 = BD['x1']
-x2 = BD['x2']
-yb1 = BD['yb1']
-yb2 = BD['yb2']
-yg1 = BD['yg1']
-yg2 = BD['yg2']
-yr1 = BD['yr1']
-yr2 = BD['yr2']
-
+# Read enhancement scheme from file (BD.csv with ';' separator or BD.txt, found in
+# the current directory or data/schemes) and compile it once into lookup tables
+registry.add_path('.')
+bd = registry.get('BD')
+x1, x2, yb1, yb2 = bd.table[:,0], bd.table[:,1], bd.table[:,2], bd.table[:,3]
 
-x = []
-yb = []
-for i in range(0, len(x1)):
-    x = np.append(x,x1[i])
-    x = np.append(x,x2[i])
-    yb = np.append(yb,yb1[i])
-    yb = np.append(yb,yb2[i])
+x = np.ravel(np.column_stack([x1,x2]))
+yb = np.ravel(np.column_stack([yb1,yb2]))
 
 fig, ax = plt.subplots(figsize=(5,5))
 plt.plot(x,x,'k')
@@ -321,49 +217,10 @@ plt.show()
 # In[31]:
 
 
-# BLUE Channel
-
-mat_b = np.zeros([nx,ny],'uint8')
-for ix in range(nx):
-    for iy in range(ny):
-        for i in range(0,len(x1)):
-            if r2pix[ix,iy] <= x2[i]:
-                a,b = linear_reg(x1[i],x2[i],yb1[i],yb2[i])
-                break
-        tmp = int(a*pic_org[ix,iy][2]+b)
-        mat_b[ix,iy] = min(255, max(0,tmp))
-        
-# GREEN Channel
-mat_g = np.zeros([nx,ny],'uint8')
-for ix in range(nx):
-    for iy in range(ny):
-        for i in range(0,len(x1)):
-            if r2pix[ix,iy] <= x2[i]:
-                a,b = linear_reg(x1[i],x2[i],yg1[i],yg2[i])
-                break
-        tmp = int(a*pic_org[ix,iy][1]+b)
-        mat_g[ix,iy] = min(255, max(0,tmp))
-        
-# RED Channel
-mat_r = np.zeros([nx,ny],'uint8')
-for ix in range(nx):
-    for iy in range(ny):
-        for i in range(0,len(x1)):
-            if r2pix[ix,iy] <= x2[i]:
-                a,b = linear_reg(x1[i],x2[i],yr1[i],yr2[i])
-                break
-        tmp = int(a*pic_org[ix,iy][0]+b)
-        mat_r[ix,iy] = min(255, max(0,tmp))
-        
-# COMPOSITE
-mat = np.zeros([nx,ny,3],'uint8')
-mat[...,0] = mat_r
-mat[...,1] = mat_g
-mat[...,2] = mat_b
-
-mat = np.rollaxis(mat,0,2)
-img_out = Image.fromarray(mat)
-img_out.save(fileorg+'_BD.jpg')
+# RED, GREEN and BLUE channels in one vectorized step: the segment is selected
+# on the green channel and applied to each channel
+mat = bd.apply(rgb)
+save_image(mat, fileorg+'_BD.jpg')
 photo = plt.imread(fileorg+'_BD.jpg')
 plt.imshow(photo)
 
@@ -51,8 +51,9 @@ import numpy as np
 import matplotlib.pyplot as plt
 import netCDF4
 from netCDF4 import Dataset
-from mpl_toolkits.basemap import Basemap
-import xarray as xr
+from gridsat import open_gridsat, read_region
+from gpi import box_pixels, cold_fraction, gpi_rain
+from geometry_cache import basemap, projected_mesh
 
 
 # In[ ]:
@@ -64,8 +65,11 @@ var = 'ir'
 filename = '/Users/macbookairdemilo/Desktop/GRIDSAT-B1.2013.11.07.12.v02r01'
 ifile = filename + '.nc'
 ofile = var + filename + '.jpg'
-ds = xr.open_dataset(ifile)
-print(ds)
+# For multi-day analyses, ingest the archive once into a Zarr store
+# (python gridsat_store.py 'data_GRIDSAT/*.nc' -o gridsat.zarr) and set GRIDSAT_STORE=gridsat.zarr:
+# the file names below are then read from the store, which only reads the chunks of the region
+with open_gridsat(ifile) as ds:    # lazy: nothing is read yet
+    print(ds)
 
 
 # In[ ]:
@@ -79,21 +83,15 @@ latmax = max(latbounds)
 lonmin = min(lonbounds)
 lonmax = max(lonbounds)
 
-# Select data of the input file
-lons = ds.lon.sel(lon=slice(lonmin,lonmax)).values
-lats = ds.lat.sel(lat=slice(latmin,latmax)).values
-if var == 'vis':
-    dat = ds.vschn.sel(lat=lats, lon=lons)
-elif var == 'ir':
-    dat = ds.irwin_cdr.sel(lat=lats, lon=lons)
-else:
-    dat = ds.irwvp.sel(lat=lats, lon=lons)
+# Select data of the input file: only the region of interest of the channel is read
+dat = read_region(ifile, var, latbounds, lonbounds)
+lons = dat.lon.values
+lats = dat.lat.values
 
 # Plot figure
 plt.figure(figsize=(10,8))
-lonsmesh, latsmesh = np.meshgrid(lons,lats)
-m = Basemap(projection='merc', llcrnrlat=latmin, urcrnrlat=latmax, llcrnrlon=lonmin,
-           urcrnrlon=lonmax, lat_ts=latmin+(latmax-latmin)/float(2), resolution='i')
+# Basemap (coastlines, countries) of the region, built once and cached on disk
+m = basemap(latbounds, lonbounds, resolution='i')
 
 # Draw parrallels and meridians
 m.drawparallels(np.arange(latmin,latmax,3), labels=[1,0,0,0], fontsize=14)
@@ -101,7 +99,7 @@ m.drawparallels(np.arange(lonmin,lonmax,3), labels=[0,0,0,1], fontsize=14)
 m.drawcoastlines(linewidth=1)
 m.drawcountries(linewidth=1)
 
-x,y = m(lonsmesh, latsmesh)
+x,y = projected_mesh(lons, lats, latbounds, lonbounds)
 m.pcolormesh(x,y,np.squeeze(dat), cmap='rainbow')
 m.colorbar()
 plt.title(filename)
@@ -112,69 +110,35 @@ plt.show()
 
 
 # We plot the animation (GIF format)
-import PIL
+# The map is built once per worker process and only the data of the mesh changes
+# from one frame to the next; frames go straight into the GIF (no intermediate JPEGs)
+from gridsat_animation import render_animation
 
 # Variable selection (water vapor, VIS or IR)
 var = 'ir' # here we take IR
 
 date = ['09','12','15','18','21']
+files = ['/Users/macbookairdemilo/Desktop/data_GRIDSAT/GRIDSAT-B1.2013.11.07.'+str(i)+'.v02r01.nc'
+         for i in date]
+
+# Region of Interest
+latbounds = [0,30]
+lonbounds = [100,140]
 
-for i in date:
-    filename = '/Users/macbookairdemilo/Desktop/data_GRIDSAT/GRIDSAT-B1.2013.11.07.'+str(i)+'.v02r01'
-    ifile = filename + '.nc'
-    ofile = var + filename + '.jpg'
-    ds = xr.open_dataset(ifile)
-
-    # Region of Interest
-    latbounds = [0,30]
-    lonbounds = [100,140]
-    latmin = min(latbounds)
-    latmax = max(latbounds)
-    lonmin = min(lonbounds)
-    lonmax = max(lonbounds)
-    
-    lons = ds.lon.sel(lon=slice(lonmin,lonmax)).values
-    lats = ds.lat.sel(lat=slice(latmin,latmax)).values
-    if var == 'vis':
-        dat = ds.vschn.sel(lat=lats, lon=lons)
-    elif var == 'ir':
-        dat = ds.irwin_cdr.sel(lat=lats, lon=lons)
-    else:
-        dat = ds.irwvp.sel(lat=lats, lon=lons)
-
-    # Plot figure
-    lonsmesh, latsmesh = np.meshgrid(lons,lats)
-    m = Basemap(projection='merc', llcrnrlat=latmin, urcrnrlat=latmax, llcrnrlon=lonmin,
-                urcrnrlon=lonmax, lat_ts=latmin+(latmax-latmin)/float(2), resolution='i')
-
-    # Draw parrallels and meridians
-    m.drawparallels(np.arange(latmin,latmax,3), labels=[1,0,0,0], fontsize=14)
-    m.drawparallels(np.arange(lonmin,lonmax,3), labels=[0,0,0,1], fontsize=14)
-
-    x,y = m(lonsmesh, latsmesh)
-
-    m.drawcoastlines(linewidth=1)
-    m.drawcountries(linewidth=1)
-    
-    m.pcolormesh(x,y,np.squeeze(dat), cmap='rainbow')
-    m.colorbar()
-    plt.title(filename)
-    plt.savefig('/Users/macbookairdemilo/Desktop/data_GRIDSAT/Animation/GRIDSAT-B1.2013.11.07.'+str(i)+'.v02r01.jpg')
-
-image_frames = []
-
-for i in date:
-    new_frame = PIL.Image.open('/Users/macbookairdemilo/Desktop/data_GRIDSAT/Animation/GRIDSAT-B1.2013.11.07.'+str(i)+'.v02r01.jpg')
-    image_frames.append(new_frame)
-    
-image_frames[0].save('/Users/macbookairdemilo/Desktop/data_GRIDSAT/Animation/haiyan_typhoon_timelapse_'+str(var)+'.gif', format = 'GIF', 
-            append_images = image_frames[1: ], 
-            save_all = True, duration = 200, 
-            loop = 3)
+render_animation(files, '/Users/macbookairdemilo/Desktop/data_GRIDSAT/Animation/haiyan_typhoon_timelapse_'+str(var)+'.gif',
+                 var, latbounds, lonbounds, duration=200, loop=3)
+
+# Storm-following loop: only a 500 km window around the best-track centre of Haiyan,
+# interpolated to the time of every file (storm_track.py, IBTrACS or JMA best track):
+# python storm_track.py ibtracs.WP.list.v04r00.csv 'data_GRIDSAT/GRIDSAT-B1.2013.11.07.*.nc' --storm 2013306N07162 -o haiyan_follow_ir.gif
 
 
 # **2/ Derive rainfall from the IR data using the GPI algorithm**
 
+# Totals over a whole archive (daily or pentad, NetCDF output): `python gpi.py 'GRIDSAT-B1.2013.11.*.nc' -o gpi_daily.nc`
+# 
+# Map frames without matplotlib (PNG/GeoTIFF or GIF loop): `python raster_output.py 'GRIDSAT-B1.2013.11.07.*.nc' --gpi -o gpi_maps/`
+
 # In[ ]:
 
 
@@ -183,7 +147,6 @@ var = 'ir'
 filename = '/Users/macbookairdemilo/Desktop/GRIDSAT-B1.2013.11.07.12.v02r01'
 ifile = filename + '.nc'
 ofile = var + filename + '.jpg'
-ds = xr.open_dataset(ifile)
 
 # Region of Interest
 latbounds = [0,30]
@@ -194,20 +157,18 @@ lonmin = min(lonbounds)
 lonmax = max(lonbounds)
 
 # Select data of the input file
-lons = ds.lon.sel(lon=slice(lonmin,lonmax)).values
-lats = ds.lat.sel(lat=slice(latmin,latmax)).values
-if var == 'vis':
-    dat = ds.vschn.sel(lat=lats, lon=lons)
-elif var == 'ir':
-    dat = ds.irwin_cdr.sel(lat=lats, lon=lons)
-else:
-    dat = ds.irwvp.sel(lat=lats, lon=lons)
+dat = read_region(ifile, var, latbounds, lonbounds)
+
+# GPI = FRAC * 3mm/h * 3h: fraction of pixels < 235K over boxes of >= 50km x 50km
+frac = cold_fraction(np.squeeze(dat), box_pixels(dat.lat.values, 50))
+rain = gpi_rain(frac, hours=3)
+lons = rain.lon.values
+lats = rain.lat.values
 
 plt.figure(figsize=(10,8))
-plt.title('GPI Precipitations (in m)')
-lonsmesh, latsmesh = np.meshgrid(lons,lats)
-m = Basemap(projection='merc', llcrnrlat=latmin, urcrnrlat=latmax, llcrnrlon=lonmin,
-           urcrnrlon=lonmax, lat_ts=latmin+(latmax-latmin)/float(2), resolution='i')
+plt.title('GPI Precipitations (in mm over 3h)')
+# Basemap (coastlines, countries) of the region, built once and cached on disk
+m = basemap(latbounds, lonbounds, resolution='i')
 
 # Draw parrallels and meridians
 m.drawparallels(np.arange(latmin,latmax,3), labels=[1,0,0,0], fontsize=14)
@@ -215,8 +176,8 @@ m.drawparallels(np.arange(lonmin,lonmax,3), labels=[0,0,0,1], fontsize=14)
 m.drawcoastlines(linewidth=1)
 m.drawcountries(linewidth=1)
 
-x,y = m(lonsmesh, latsmesh)
-m.pcolormesh(x,y,((np.squeeze(dat)<235)/(np.squeeze(dat)))*3, cmap='rainbow')
+x,y = projected_mesh(lons, lats, latbounds, lonbounds)
+m.pcolormesh(x,y,rain, cmap='rainbow')
 m.colorbar()
 plt.title(filename)
 plt.show()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""On-disk cache of decoded and calibrated Himawari bands, read back memory-mapped.
+
+Decoding the HSD segments and calibrating them to reflectance or brightness
+temperature is most of the cost of a Himawari product, and CYCLONES.py pays it
+again for every composite and every crop of the same slot. Calibrated band
+arrays are stored as NPY files (with their area and attributes pickled
+alongside) under the key (slot, band, calibration, bounding box), in
+``BAND_CACHE_DIR`` (by default ``~/.cache/remote-sensing-atmosphere/bands``).
+A cached band is read with ``np.load(mmap_mode='r')``: nothing is decoded and
+only the pages that are used are read. The least recently used bands are
+evicted when the cache grows over ``BAND_CACHE_SIZE`` bytes (10 GB by default)::
+
+    bands = load_bands(files, ['B13', 'B08'], 'brightness_temperature', (80, 20, 140, 45))
+"""
+
+import argparse
+import hashlib
+import os
+import pickle
+import re
+import sys
+import warnings
+
+import numpy as np
+import xarray as xr
+
+from hsd_roi import select_segments
+
+CACHE_DIR = os.environ.get('BAND_CACHE_DIR',
+                           os.path.join(os.path.expanduser('~'), '.cache',
+                                        'remote-sensing-atmosphere', 'bands'))
+MAX_BYTES = int(float(os.environ.get('BAND_CACHE_SIZE', 10e9)))
+
+# Attributes kept with the arrays (what satpy compositors and writers use)
+ATTRS = ('name', 'area', 'units', 'standard_name', 'calibration', 'wavelength', 'resolution',
+         'modifiers', 'start_time', 'end_time', 'platform_name', 'sensor', 'orbital_parameters')
+
+_SLOT = re.compile(r'HS_(H\d{2})_(\d{8})_(\d{4})_B(\d{2})', re.IGNORECASE)
+
+
+def file_slot(filename):
+    """(slot, band) of an HSD file name, e.g. ('H09_20231217_0010', 'B01')."""
+    m = _SLOT.search(os.path.basename(filename))
+    if m is None:
+        raise ValueError('%s: not an HSD file name (HS_H09_YYYYMMDD_HHMM_Bnn_...)' % filename)
+    return '%s_%s_%s' % m.group(1, 2, 3), 'B' + m.group(4)
+
+
+class BandCache(object):
+    """Calibrated band arrays keyed by (slot, band, calibration, bounding box)."""
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def path(self, slot, band, calibration, bbox=None):
+        box = tuple(float(v) for v in bbox) if bbox is not None else None
+        digest = hashlib.sha256(repr(box).encode()).hexdigest()[:8]
+        return os.path.join(self.cache_dir, '%s_%s_%s_%s.npy' % (slot, band, calibration, digest))
+
+    def get(self, slot, band, calibration, bbox=None):
+        """Memory-mapped DataArray of a cached band, or None."""
+        path = self.path(slot, band, calibration, bbox)
+        try:
+            data = np.load(path, mmap_mode='r')
+            with open(path[:-4] + '.pkl', 'rb') as f:
+                attrs = pickle.load(f)
+        except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+            return None
+        # Last use, for the LRU eviction
+        os.utime(path)
+        return xr.DataArray(data, dims=('y', 'x'), name=band, attrs=attrs)
+
+    def put(self, slot, band, calibration, arr, bbox=None):
+        """Store a (computed or lazy) 2-D DataArray; return its memory-mapped copy."""
+        path = self.path(slot, band, calibration, bbox)
+        attrs = dict((k, arr.attrs[k]) for k in ATTRS if k in arr.attrs)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = '%s.%d.tmp' % (path[:-4], os.getpid())
+            with open(tmp + '.npy', 'wb') as f:
+                np.save(f, np.asarray(arr.values, 'float32'))
+            with open(tmp + '.pkl', 'wb') as f:
+                pickle.dump(attrs, f, protocol=pickle.HIGHEST_PROTOCOL)
+            # Attributes first: a band file is only visible once complete
+            os.replace(tmp + '.pkl', path[:-4] + '.pkl')
+            os.replace(tmp + '.npy', path)
+        except (OSError, pickle.PicklingError) as e:
+            warnings.warn('cannot cache %s %s: %s' % (slot, band, e))
+            return arr
+        cached = self.get(slot, band, calibration, bbox)
+        # The new band stays, even when it is larger than the cache on its own
+        self.evict(keep=path)
+        return cached if cached is not None else arr
+
+    def entries(self):
+        """(last use, bytes, path) of the cached bands, least recently used first."""
+        entries = []
+        if os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.npy') and '.tmp' not in name:
+                    st = os.stat(os.path.join(self.cache_dir, name))
+                    entries.append((st.st_mtime, st.st_size, os.path.join(self.cache_dir, name)))
+        return sorted(entries)
+
+    def evict(self, max_bytes=None, keep=None):
+        """Remove the least recently used bands (but ``keep``) until the cache fits ``max_bytes``."""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            if path == keep:
+                continue
+            for p in (path, path[:-4] + '.pkl'):
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+            total -= size
+            removed += 1
+        return removed
+
+
+def load_bands(files, bands, calibration, bbox=None, cache=None, reader='ahi_hsd'):
+    """{band: DataArray} of calibrated bands of one slot, decoded only when not cached.
+
+    ``files`` are the HSD files of the slot; with ``bbox`` only the segments
+    of the box are decoded and the bands are cropped to it. ``cache=False``
+    decodes without caching (one-off boxes, e.g. the moving windows of a storm).
+    """
+    keep = cache is not False
+    cache = cache or BandCache()
+    slots = set(file_slot(f)[0] for f in files)
+    if len(slots) != 1:
+        raise ValueError('files of %d slots, expected one' % len(slots))
+    slot = slots.pop()
+
+    out = {}
+    missing = []
+    for band in bands:
+        arr = cache.get(slot, band, calibration, bbox) if keep else None
+        if arr is None:
+            missing.append(band)
+        else:
+            out[band] = arr
+    if missing:
+        from satpy import Scene
+        wanted = [f for f in files if file_slot(f)[1] in missing]
+        if bbox is not None:
+            wanted = select_segments(wanted, bbox)
+        scn = Scene(filenames=wanted, reader=reader)
+        scn.load(missing, calibration=calibration)
+        if bbox is not None:
+            scn = scn.crop(ll_bbox=tuple(bbox))
+        for band in missing:
+            out[band] = cache.put(slot, band, calibration, scn[band], bbox) if keep else \
+                scn[band].compute()
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--max-bytes', type=float, help='evict down to this size')
+    args = parser.parse_args(argv)
+
+    cache = BandCache()
+    if args.max_bytes is not None:
+        print('%d band(s) evicted' % cache.evict(int(args.max_bytes)))
+    entries = cache.entries()
+    print('%s: %d band(s), %.1f MB (limit %.1f MB)'
+          % (cache.cache_dir, len(entries), sum(e[1] for e in entries)/1e6, cache.max_bytes/1e6))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
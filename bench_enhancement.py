@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Benchmark of the enhancement schemes across image sizes.
+
+Example::
+
+    python bench_enhancement.py --sizes 701x601 2750x2750 5500x5500
+
+Every scheme (shift, contrast, ZA, MB, BD) runs on the bundled Himawari image
+(``data/se1_b03_0410.jpg``) and on synthetic images of the requested sizes,
+built by tiling that image, so the benchmark runs offline. Each case runs in a
+fresh process and reports the best wall time, the pixels per second and the
+peak RSS of that process. The original per-pixel loops of Image_ehancement.py
+run on the sizes up to ``--legacy-max-pixels``; their outputs are checked
+against the lookup-table engine.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+import numpy as np
+
+from enhancement import ColourScheme, apply_lut, linear_reg, load_image
+from scheme_registry import get_registry, read_scheme
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+IMAGE = os.path.join(DATA_DIR, 'se1_b03_0410.jpg')
+SCHEMES = ['ln_up', 'more_contrast', 'less_contrast', 'ZA', 'MB', 'BD']
+
+# Three-channel table used when no BD scheme file is available: the timing of
+# the BD pass does not depend on the values of the table
+SYNTHETIC_BD = [[0,80,0,80,0,80,0,80],
+                [80,140,100,200,100,200,100,200],
+                [140,200,255,0,0,0,0,255],
+                [200,255,255,255,255,255,255,255]]
+
+
+# Original per-pixel loops of Image_ehancement.py, on [x, y] indexed arrays
+
+def legacy_linear(r2pix, a, b):
+    nx,ny = r2pix.shape
+    out = np.zeros([nx,ny],'uint8')
+    for ix in range(nx):
+        for iy in range(ny):
+            tmp = int(a*r2pix[ix,iy]+b)
+            out[ix,iy] = min(255,max(0,tmp))
+    return out
+
+
+def legacy_shift(r2pix, offset):
+    nx,ny = r2pix.shape
+    out = np.zeros([nx,ny],'uint8')
+    for ix in range(nx):
+        for iy in range(ny):
+            out[ix,iy] = min(255,max(0,int(r2pix[ix,iy])+offset))
+    return out
+
+
+def legacy_piecewise(r2pix, x, y):
+    nx,ny = r2pix.shape
+    out = np.zeros([nx,ny],'uint8')
+    for ix in range(nx):
+        for iy in range(ny):
+            i=0
+            while (r2pix[ix,iy] >= x[i]) and (i < len(x)-1):
+                i = i+1
+            a,b = linear_reg(x[i-1],x[i],y[i-1],y[i])
+            out[ix,iy] = min(max(int(a*r2pix[ix,iy]+b),0),255)
+    return out
+
+
+def legacy_bd(pic, table):
+    # pic: [x, y, channel]; segment chosen on the green channel
+    nx,ny = pic.shape[:2]
+    x1, x2 = table[:,0], table[:,1]
+    mat = np.zeros([nx,ny,3],'uint8')
+    for c, col in ((2,2), (1,4), (0,6)):
+        for ix in range(nx):
+            for iy in range(ny):
+                for i in range(0,len(x1)):
+                    if pic[ix,iy,1] <= x2[i]:
+                        a,b = linear_reg(x1[i],x2[i],table[i,col],table[i,col+1])
+                        break
+                tmp = int(a*pic[ix,iy,c]+b)
+                mat[ix,iy,c] = min(255, max(0,tmp))
+    return mat
+
+
+def bd_table():
+    filename = get_registry().find('BD')
+    if filename is None:
+        return np.array(SYNTHETIC_BD), 'synthetic table'
+    return read_scheme(filename)[1], filename
+
+
+def make_image(shape):
+    """RGB image of ``shape`` (rows, cols) tiled from the bundled image."""
+    rgb = load_image(IMAGE)
+    if shape is None:
+        return rgb
+    reps = (-(-shape[0]//rgb.shape[0]), -(-shape[1]//rgb.shape[1]), 1)
+    return np.ascontiguousarray(np.tile(rgb, reps)[:shape[0], :shape[1]])
+
+
+def _engine(scheme):
+    # Compiled once, outside of the timed section
+    if scheme == 'BD':
+        bd = ColourScheme(bd_table()[0])
+        return bd.apply
+    lut = get_registry().get(scheme)
+    return lambda rgb: apply_lut(rgb[...,1], lut)
+
+
+def _legacy(scheme, rgb):
+    pic = np.swapaxes(rgb, 0, 1)    # [x, y] indexing of the original code
+    r2pix = pic[...,1]
+    if scheme == 'ln_up':
+        out = legacy_shift(r2pix, 50)
+    elif scheme == 'more_contrast':
+        out = legacy_linear(r2pix, *linear_reg(75,100,0,255))
+    elif scheme == 'less_contrast':
+        out = legacy_linear(r2pix, *linear_reg(0,255,75,100))
+    elif scheme == 'BD':
+        out = legacy_bd(pic, bd_table()[0])
+    else:
+        x, y = read_scheme(get_registry().find(scheme))[1]
+        out = legacy_piecewise(r2pix, list(x), list(y))
+    return np.rollaxis(out,0,2)
+
+
+def run_case(scheme, shape, impl, repeat):
+    """Time one case (run in its own process); return a result dict."""
+    rgb = make_image(shape)
+    func = _engine(scheme) if impl == 'lut' else (lambda rgb: _legacy(scheme, rgb))
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = func(rgb)
+        times.append(time.perf_counter() - t0)
+    npix = rgb.shape[0]*rgb.shape[1]
+    res = {'scheme': scheme, 'impl': impl, 'shape': list(rgb.shape[:2]),
+           'seconds': min(times), 'pixels_per_s': npix/min(times),
+           'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024.,
+           'checksum': int(np.sum(out, dtype='uint64'))}
+    if impl == 'legacy':
+        res['match'] = bool(np.array_equal(out, _engine(scheme)(rgb)))
+    return res
+
+
+def parse_size(text):
+    if text == 'real':
+        return None
+    rows, cols = text.lower().split('x')
+    return int(rows), int(cols)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--schemes', nargs='+', default=SCHEMES)
+    parser.add_argument('--sizes', nargs='+', default=['real', '1100x1100', '2750x2750', '5500x5500'],
+                        help="'real' (the bundled image) or ROWSxCOLS")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--legacy-max-pixels', type=int, default=701*601,
+                        help='largest image on which the per-pixel loops run')
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args(argv)
+
+    if 'BD' in args.schemes:
+        print('BD scheme: %s' % bd_table()[1])
+    ctx = multiprocessing.get_context('spawn')
+    results = []
+    print('%-14s %-6s %12s %10s %14s %10s %6s'
+          % ('scheme', 'impl', 'size', 'time (s)', 'pixels/s', 'RSS (MB)', 'match'))
+    for size in args.sizes:
+        shape = parse_size(size)
+        npix = np.prod(shape) if shape else np.prod(load_image(IMAGE).shape[:2])
+        for scheme in args.schemes:
+            impls = ['lut'] + (['legacy'] if npix <= args.legacy_max_pixels else [])
+            for impl in impls:
+                # A fresh process per case, so the peak RSS is the one of the case
+                with ctx.Pool(1) as pool:
+                    res = pool.apply(run_case, (scheme, shape, impl,
+                                                1 if impl == 'legacy' else args.repeat))
+                results.append(res)
+                print('%-14s %-6s %12s %10.4f %14.3g %10.1f %6s'
+                      % (scheme, impl, 'x'.join(map(str, res['shape'])), res['seconds'],
+                         res['pixels_per_s'], res['peak_rss_mb'], res.get('match', '')))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
+    return 0 if all(r.get('match', True) for r in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Block and sliding-window fractions of cold pixels (Arkin/GPI coarse-graining).
+
+- ``block_fraction``: non-overlapping N x M blocks, reduced through zero-copy
+  (rows//N, N, cols//M, M) views of the region; partial edge blocks are either
+  kept (reduced over the pixels they have) or trimmed.
+- ``sliding_fraction``: windows of any size centred on every pixel (or on a
+  coarser step), from summed-area tables, i.e. O(1) per output cell whatever
+  the window size.
+
+NaN and ``fill_value`` pixels are excluded from both the cold and the valid
+counts; cells without any valid pixel are NaN.
+"""
+
+import numpy as np
+
+GPI_THRESHOLD = 235.    # K
+
+
+def valid_and_cold(tb, threshold=GPI_THRESHOLD, fill_value=None):
+    """Boolean masks (valid, cold) of a brightness temperature array."""
+    tb = np.asarray(tb)
+    valid = np.isfinite(tb) if tb.dtype.kind == 'f' else np.ones(tb.shape, bool)
+    if fill_value is not None:
+        valid &= tb != fill_value
+    with np.errstate(invalid='ignore'):
+        cold = (tb < threshold) & valid
+    return valid, cold
+
+
+def block_view(a, n, m=None):
+    """Zero-copy (rows//n, n, cols//m, m) view of the full blocks of a 2-D array."""
+    m = m or n
+    rows, cols = (a.shape[0]//n)*n, (a.shape[1]//m)*m
+    # Splitting an axis never needs a copy, even on a sliced (non-contiguous) array
+    return a[:rows, :cols].reshape(rows//n, n, cols//m, m)
+
+
+def block_sum(a, n, m=None, partial=True, dtype='int64'):
+    """Sums over non-overlapping n x m blocks of a 2-D array.
+
+    With ``partial`` the edge blocks that are smaller than n x m are summed over
+    the pixels they have (output shape ceil(rows/n) x ceil(cols/m)); otherwise
+    they are dropped. Regions smaller than one block give one partial block::
+
+        >>> block_sum(np.ones((3, 12), int), 5)
+        array([[15, 15,  6]])
+    """
+    m = m or n
+    nr, nc = a.shape[0]//n, a.shape[1]//m
+    core = block_view(a, n, m).sum(axis=(1, 3), dtype=dtype)
+    if not partial or (a.shape[0] == nr*n and a.shape[1] == nc*m):
+        return core
+
+    out = np.zeros((-(-a.shape[0]//n), -(-a.shape[1]//m)), dtype)
+    out[:nr, :nc] = core
+    if a.shape[1] > nc*m:
+        # Right column of partial blocks
+        right = a[:nr*n, nc*m:]
+        out[:nr, nc] = right.reshape(nr, n, a.shape[1] - nc*m).sum(axis=(1, 2), dtype=dtype)
+    if a.shape[0] > nr*n:
+        # Bottom row of partial blocks (and the corner)
+        bottom = a[nr*n:, :nc*m]
+        out[nr, :nc] = bottom.reshape(bottom.shape[0], nc, m).sum(axis=(0, 2), dtype=dtype)
+        if a.shape[1] > nc*m:
+            out[nr, nc] = a[nr*n:, nc*m:].sum(dtype=dtype)
+    return out
+
+
+def block_fraction(tb, n, m=None, threshold=GPI_THRESHOLD, fill_value=None,
+                   partial=True, return_counts=False):
+    """Fraction of valid pixels colder than ``threshold`` in n x m blocks."""
+    valid, cold = valid_and_cold(tb, threshold, fill_value)
+    ncold = block_sum(cold, n, m, partial)
+    nvalid = block_sum(valid, n, m, partial)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        frac = np.where(nvalid > 0, ncold/nvalid, np.nan)
+    if return_counts:
+        return frac, nvalid
+    return frac
+
+
+def block_mean_coord(coord, n, partial=True):
+    """Centre coordinate of the blocks of a 1-D coordinate."""
+    coord = np.asarray(coord, 'float64')
+    full = (len(coord)//n)*n
+    centres = coord[:full].reshape(-1, n).mean(axis=1)
+    if partial and full < len(coord):
+        centres = np.append(centres, coord[full:].mean())
+    return centres
+
+
+def summed_area_table(a, dtype='int64'):
+    """Summed-area table of a 2-D array, padded with a leading row/column of zeros."""
+    sat = np.zeros((a.shape[0]+1, a.shape[1]+1), dtype)
+    np.cumsum(a, axis=0, dtype=dtype, out=sat[1:, 1:])
+    np.cumsum(sat[1:, 1:], axis=1, out=sat[1:, 1:])
+    return sat
+
+
+def window_sum(sat, size, step=1, mode='same'):
+    """Sums over h x w windows from a summed-area table (four lookups per cell).
+
+    ``mode='same'``: windows centred on every ``step``-th pixel, clipped at the
+    edges; ``mode='valid'``: only the windows fully inside the array, starting
+    at every ``step``-th pixel.
+    """
+    h, w = (size, size) if np.isscalar(size) else size
+    rows, cols = sat.shape[0]-1, sat.shape[1]-1
+    if mode == 'valid':
+        r0 = np.arange(0, rows-h+1, step)
+        c0 = np.arange(0, cols-w+1, step)
+        r1, c1 = r0 + h, c0 + w
+    elif mode == 'same':
+        r = np.arange(0, rows, step)
+        c = np.arange(0, cols, step)
+        r0, r1 = np.clip(r - h//2, 0, rows), np.clip(r - h//2 + h, 0, rows)
+        c0, c1 = np.clip(c - w//2, 0, cols), np.clip(c - w//2 + w, 0, cols)
+    else:
+        raise ValueError("mode must be 'same' or 'valid'")
+    return (sat[np.ix_(r1, c1)] - sat[np.ix_(r0, c1)]
+            - sat[np.ix_(r1, c0)] + sat[np.ix_(r0, c0)])
+
+
+def sliding_fraction(tb, size, threshold=GPI_THRESHOLD, fill_value=None, step=1, mode='same'):
+    """Fraction of valid cold pixels in sliding windows of ``size`` (int or (h, w))."""
+    valid, cold = valid_and_cold(tb, threshold, fill_value)
+    ncold = window_sum(summed_area_table(cold), size, step, mode)
+    nvalid = window_sum(summed_area_table(valid), size, step, mode)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(nvalid > 0, ncold/nvalid, np.nan)
+
+
+def block_mean(values, n, m=None, partial=True):
+    """Mean of the finite values in n x m blocks (NaN where a block has none)."""
+    values = np.asarray(values, 'float64')
+    valid = np.isfinite(values)
+    total = block_sum(np.where(valid, values, 0.), n, m, partial, dtype='float64')
+    count = block_sum(valid, n, m, partial)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(count > 0, total/count, np.nan)
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Shared band loads for a list of Himawari products (RGB composites and enhanced IR).
+
+Example::
+
+    python composite_planner.py 'data_HIMAWARI/202312170010/*.DAT' \\
+        -p true_color airmass dust water_vapour dvorak --bbox 80 20 140 45 -o out/
+
+Loading the composites one at a time (CYCLONES.py) loads and calibrates the
+bands they share again for every composite: B13 is used by airmass, dust and
+the Dvorak IR, B08 by airmass and water vapour. satpy shares them when the
+composites are requested in a single ``Scene.load([...])`` call (it resolves
+their dependency tree and reads every band once), within one Scene. The planner
+does the same for its own recipes on top of band_cache.py: it collects the
+(band, calibration) pairs of all the requested products, loads each of them
+once (only the segments of the box are decoded, and not at all when the slot
+is already cached, from any earlier run), and builds every product from the
+shared arrays in one pass. It reports the reads and bytes saved compared with
+loading the bands of every product separately, and an estimate of the time
+saved (the load time of a batch of bands of a calibration, divided evenly
+among them).
+
+The recipes are numpy versions of the EUMETSAT RGB definitions adapted to the
+AHI bands, not the satpy compositors: true colour has no sun-zenith or
+Rayleigh correction (its three bands, at 0.5, 1 and 1 km, are brought to the
+grid of the coarsest one), and ``water_vapour`` is a linear B08 stretch, not
+satpy's ``water_vapors1``. satpy composites (``water_vapors1``...) are not
+planned here: load them together in one ``Scene.load`` call, e.g. through
+``himawari_pipeline.py -p``.
+"""
+
+import argparse
+import collections
+import os
+import sys
+import time
+
+import numpy as np
+
+from band_cache import load_bands
+from file_inputs import input_files
+
+REFLECTANCE = 'reflectance'
+BT = 'brightness_temperature'
+
+
+def stretch(x, vmin, vmax, gamma=1.):
+    """8-bit linear (then gamma) stretch of ``x`` from [vmin, vmax]; NaN to 0."""
+    x = (np.asarray(x, 'float32') - vmin)/(vmax - vmin)
+    x = np.clip(np.nan_to_num(x, nan=0.), 0., 1.)
+    if gamma != 1.:
+        x **= 1./gamma
+    return np.rint(x*255).astype('uint8')
+
+
+def on_grid(arr, shape):
+    """Nearest-pixel copy of a 2-D array on a grid of ``shape`` covering the same area."""
+    arr = np.asarray(arr)
+    if arr.shape == tuple(shape):
+        return arr
+    rows = ((np.arange(shape[0]) + 0.5)*arr.shape[0]/shape[0]).astype('intp')
+    cols = ((np.arange(shape[1]) + 0.5)*arr.shape[1]/shape[1]).astype('intp')
+    return arr[np.ix_(rows, cols)]
+
+
+def _rgb(r, g, b):
+    shape = min(r.shape, g.shape, b.shape)
+    return np.dstack([on_grid(c, shape) for c in (r, g, b)])
+
+
+def true_color(b):
+    return _rgb(stretch(b['B03'], 0., 100., 2.), stretch(b['B02'], 0., 100., 2.),
+                stretch(b['B01'], 0., 100., 2.))
+
+
+def airmass(b):
+    return _rgb(stretch(b['B08'] - b['B10'], -26.2, 0.6), stretch(b['B12'] - b['B13'], -43.2, 6.7),
+                stretch(b['B08'], 243.9, 208.5))
+
+
+def dust(b):
+    return _rgb(stretch(b['B15'] - b['B13'], -6.7, 2.6), stretch(b['B13'] - b['B11'], -0.5, 20., 2.5),
+                stretch(b['B13'], 261.2, 288.7))
+
+
+def water_vapour(b):
+    return stretch(b['B08'], 280., 180.)
+
+
+def dvorak(b, scheme='BD'):
+    """B13 brightness temperatures through an enhancement curve of the scheme registry."""
+    from dvorak import temperature_lut
+    return temperature_lut(scheme)(b['B13'])
+
+
+# Product: ((band, calibration), ...), builder of the 8-bit image from {band: array}
+RECIPES = {
+    'true_color': ((('B01', REFLECTANCE), ('B02', REFLECTANCE), ('B03', REFLECTANCE)), true_color),
+    'airmass': ((('B08', BT), ('B10', BT), ('B12', BT), ('B13', BT)), airmass),
+    'dust': ((('B11', BT), ('B13', BT), ('B15', BT)), dust),
+    'water_vapour': ((('B08', BT),), water_vapour),
+    'dvorak': ((('B13', BT),), dvorak),
+}
+
+
+class Plan(object):
+    """Unique (band, calibration) reads of a list of products."""
+
+    def __init__(self, products):
+        unknown = [p for p in products if p not in RECIPES]
+        if unknown:
+            raise KeyError('unknown product(s) %s (available: %s)'
+                           % (', '.join(unknown), ', '.join(sorted(RECIPES))))
+        self.products = list(products)
+        self.users = collections.OrderedDict()
+        for product in self.products:
+            for read in RECIPES[product][0]:
+                self.users.setdefault(read, []).append(product)
+
+    @property
+    def reads(self):
+        """(band, calibration) pairs to load, each once."""
+        return list(self.users)
+
+    @property
+    def naive_reads(self):
+        """Number of band loads when every product loads its own bands."""
+        return sum(len(users) for users in self.users.values())
+
+    def by_calibration(self):
+        groups = collections.OrderedDict()
+        for band, calibration in self.reads:
+            groups.setdefault(calibration, []).append(band)
+        return groups
+
+
+def run(files, products, bbox=None, cache=None):
+    """Build ``products`` of one slot; return ({product: 8-bit image}, report dict)."""
+    plan = Plan(products)
+    bands = {}
+    seconds = {}
+    for calibration, names in plan.by_calibration().items():
+        t0 = time.perf_counter()
+        loaded = load_bands(files, names, calibration, bbox, cache)
+        dt = (time.perf_counter() - t0)/len(names)
+        for name in names:
+            # Pages of the memory-mapped cache are read here
+            bands[name] = np.asarray(loaded[name], 'float32')
+            seconds[name, calibration] = dt
+    t0 = time.perf_counter()
+    images = dict((p, RECIPES[p][1](bands)) for p in plan.products)
+    build = time.perf_counter() - t0
+
+    nbytes = dict(((b, c), bands[b].nbytes) for b, c in plan.reads)
+    report = {
+        'reads': len(plan.reads),
+        'naive_reads': plan.naive_reads,
+        'saved_reads': plan.naive_reads - len(plan.reads),
+        'bytes': sum(nbytes.values()),
+        'bytes_saved': sum(nbytes[r]*(len(u) - 1) for r, u in plan.users.items()),
+        'load_seconds': sum(seconds.values()),
+        # Per-band times are the batch time of a calibration divided evenly: an estimate
+        'estimated_seconds_saved': sum(seconds[r]*(len(u) - 1) for r, u in plan.users.items()),
+        'build_seconds': build,
+        'shared': dict(('%s/%s' % r, u) for r, u in plan.users.items() if len(u) > 1),
+    }
+    return images, report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('inputs', nargs='+', help='HSD files of one slot, or glob patterns')
+    parser.add_argument('-p', '--products', nargs='+', default=sorted(RECIPES),
+                        help='products (default: all of %s)' % ', '.join(sorted(RECIPES)))
+    parser.add_argument('--bbox', type=float, nargs=4,
+                        metavar=('LON_MIN', 'LAT_MIN', 'LON_MAX', 'LAT_MAX'))
+    parser.add_argument('--scheme-path', action='append', default=[],
+                        help='scheme directory or file (e.g. BD.csv) for dvorak, may be repeated')
+    parser.add_argument('-o', '--outdir', help='write the products as PNG here')
+    parser.add_argument('-n', '--dry-run', action='store_true', help='only print the plan')
+    args = parser.parse_args(argv)
+
+    try:
+        plan = Plan(args.products)
+    except KeyError as e:
+        parser.error(e.args[0])
+    print('%d band read(s) instead of %d:' % (len(plan.reads), plan.naive_reads))
+    for (band, calibration), users in plan.users.items():
+        print('  %s %-22s %s' % (band, calibration, ', '.join(users)))
+    if args.dry_run:
+        return 0
+
+    files = input_files(parser, args.inputs)
+    from scheme_registry import get_registry
+    for path in args.scheme_path:
+        get_registry().add_path(path)
+    images, report = run(files, args.products, args.bbox)
+    print('loaded %.1f MB in %.2f s, built %d product(s) in %.2f s'
+          % (report['bytes']/1e6, report['load_seconds'], len(images), report['build_seconds']))
+    print('saved %d read(s), %.1f MB, about %.2f s (estimated)'
+          % (report['saved_reads'], report['bytes_saved']/1e6, report['estimated_seconds_saved']))
+    if args.outdir:
+        from raster_output import write_raster
+        os.makedirs(args.outdir, exist_ok=True)
+        for product, img in images.items():
+            write_raster(img, os.path.join(args.outdir, '%s.png' % product))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Dvorak-enhanced IR product from AHI band 13 brightness temperatures.
+
+Example::
+
+    python dvorak.py data_HIMAWARI -s BD --scheme-path BD.csv --centre 131.5 10.5 -o bd_loop.gif
+    python dvorak.py data_HIMAWARI -s BD --track bst_all.txt --storm JELAWAT -o bd.gif
+
+Image_ehancement.py applies the BD curve to 8-bit JPEGs downloaded from JMA.
+Here the NOAA curves of the scheme registry (BD, ZA, MB... any grey or colour
+curve) are applied to the calibrated B13 temperatures of the HSD files: every
+curve is compiled once into a table indexed by brightness temperature (the
+0.01 K TbTable of rain_estimators.py, through the GOES count convention of
+enhancement.tb_to_count), so enhancing a frame is a single gather. The frames
+are storm-centred crops (only the HSD segments and rows of the window are
+decoded, and not kept in the band cache) and go straight to the GIF/MP4 or image
+writers, without intermediate PNG/JPEG files. With ``--track`` the window
+follows the best-track centre interpolated to every slot (storm_track.py).
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from band_cache import load_bands
+from enhancement import ColourScheme, tb_to_count
+from gridsat import KM_PER_DEGREE
+from rain_estimators import TbTable
+from scheme_registry import get_registry
+
+_tables = {}
+
+
+class TemperatureLUT(TbTable):
+    """Enhancement curve (grey table or ColourScheme) tabulated on brightness temperature.
+
+    Same output as the curve applied to ``tb_to_count(tb)``, to the 0.01 K
+    step of rain_estimators.TbTable; NaN gets the colour of count 0, as in
+    tb_to_count.
+    """
+
+    def __init__(self, curve, **kwargs):
+        if isinstance(curve, ColourScheme):
+            palette = curve.palette
+        elif isinstance(curve, np.ndarray) and curve.shape == (256,):
+            palette = curve
+        else:
+            raise TypeError('%r is not a per-count curve (adaptive schemes depend on the image)'
+                            % (curve,))
+        TbTable.__init__(self, lambda tb: palette[tb_to_count(tb)], dtype='uint8',
+                         fill=palette[0], **kwargs)
+
+
+def temperature_lut(scheme='BD'):
+    """TemperatureLUT of a registry scheme, compiled once per process."""
+    if scheme not in _tables:
+        _tables[scheme] = TemperatureLUT(get_registry().get(scheme))
+    return _tables[scheme]
+
+
+def storm_bbox(lon, lat, radius_km=500.):
+    """(lon_min, lat_min, lon_max, lat_max) of a window of ``radius_km`` around a centre."""
+    dlat = radius_km/KM_PER_DEGREE
+    dlon = radius_km/(KM_PER_DEGREE*max(np.cos(np.radians(lat)), 0.01))
+    return (lon - dlon, lat - dlat, lon + dlon, lat + dlat)
+
+
+def dvorak_frame(files, centre, scheme='BD', radius_km=500., cache=False):
+    """Enhanced storm-centred B13 image of the HSD files of one slot.
+
+    The window of a slot is used once: it is decoded without the band cache,
+    unless a BandCache is given.
+    """
+    bbox = storm_bbox(centre[0], centre[1], radius_km)
+    tb = load_bands(files, ['B13'], 'brightness_temperature', bbox, cache)['B13']
+    return temperature_lut(scheme)(tb)
+
+
+def iter_frames(slots, centre, scheme='BD', radius_km=500., cache=False):
+    """(slot, enhanced frame) of slot folders; ``centre`` is (lon, lat) or a
+    function of the slot path returning it (None skips the slot)."""
+    from himawari_pipeline import slot_files
+    for path in slots:
+        c = centre(path) if callable(centre) else centre
+        if c is None:
+            continue
+        yield path, dvorak_frame(slot_files(path), c, scheme, radius_km, cache)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('root', help='directory of YYYYMMDDHHMM slot folders of HSD files')
+    parser.add_argument('-s', '--scheme', default='BD')
+    parser.add_argument('--scheme-path', action='append', default=[],
+                        help='scheme directory or file (e.g. BD.csv), may be repeated')
+    where = parser.add_mutually_exclusive_group(required=True)
+    where.add_argument('--centre', type=float, nargs=2, metavar=('LON', 'LAT'))
+    where.add_argument('--track', help='best-track file (IBTrACS CSV or JMA) of a moving window')
+    parser.add_argument('--storm', help='storm of the track file (SID, name or JMA number)')
+    parser.add_argument('--radius-km', type=float, default=500.)
+    parser.add_argument('-o', '--output', required=True,
+                        help='.gif/.mp4 loop, or directory of PNG frames')
+    parser.add_argument('--duration', type=float, default=200, help='ms per frame')
+    args = parser.parse_args(argv)
+
+    from himawari_pipeline import iter_slots
+    for path in args.scheme_path:
+        get_registry().add_path(path)
+    try:
+        temperature_lut(args.scheme)
+    except (KeyError, TypeError) as e:
+        parser.error(e.args[0])
+
+    centre = tuple(args.centre or ())
+    if args.track:
+        from storm_track import read_track, slot_centre
+        try:
+            centre = slot_centre(read_track(args.track, args.storm))
+        except ValueError as e:
+            parser.error(e.args[0])
+
+    t0 = time.perf_counter()
+    frames = iter_frames(iter_slots(args.root), centre, args.scheme, args.radius_km)
+    n = 0
+    if os.path.splitext(args.output)[1].lower() in ('.gif', '.mp4'):
+        from composite_planner import on_grid
+        from enhance_sequence import open_writer
+        shape = None
+        with open_writer(args.output, args.duration) as writer:
+            for _, frame in frames:
+                # The window of a moving centre changes size with latitude
+                shape = shape or frame.shape[:2]
+                writer.append(on_grid(frame, shape))
+            n = writer.nframes
+    else:
+        from raster_output import write_raster
+        os.makedirs(args.output, exist_ok=True)
+        for path, frame in frames:
+            write_raster(frame, os.path.join(args.output, '%s_B13_%s.png'
+                                             % (os.path.basename(os.path.normpath(path)),
+                                                args.scheme)))
+            n += 1
+    dt = time.perf_counter() - t0
+    print('%s: %d frame(s) in %.2f s (%.1f frames/s)' % (args.output, n, dt, n/dt if dt else 0.))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Batch enhancement of Himawari JPEGs (se1_bXX_HHMM.jpg) over a process pool.
+
+Example::
+
+    python enhance_batch.py 'data/se1_b*.jpg' -s ZA MB BD --scheme-path BD.csv -o out/
+
+Each input image is decoded once, enhanced with every requested scheme and the
+results are written next to it (or in ``--outdir``) as ``<name>_<scheme>.jpg``,
+the naming of Image_ehancement.py. Outputs newer than their input are skipped.
+Schemes are the built-in ones of enhancement.py and the scheme files of
+scheme_registry.py (``--scheme-path`` adds a directory or a single file).
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from enhancement import ColourScheme, apply_lut, load_image, save_image
+from file_inputs import input_files
+from histogram_enhancement import AdaptiveScheme
+from scheme_registry import get_registry
+
+
+def _init_worker(scheme_paths):
+    registry = get_registry()
+    for path in scheme_paths:
+        registry.add_path(path)
+
+
+def output_path(filename, scheme, outdir=None, ext='.jpg'):
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    return os.path.join(outdir or os.path.dirname(filename), stem + '_' + scheme + ext)
+
+
+def is_up_to_date(src, dst):
+    return os.path.exists(dst) and os.path.getmtime(dst) >= os.path.getmtime(src)
+
+
+def enhance_file(filename, schemes, outdir=None, force=False, quality=95):
+    """Enhance one image with every scheme; return the number of outputs written."""
+    todo = [s for s in schemes
+            if force or not is_up_to_date(filename, output_path(filename, s, outdir))]
+    if not todo:
+        return 0
+
+    rgb = load_image(filename)
+    # The grey schemes work on the green channel (a view), as in Image_ehancement.py
+    # (grey images go through the palette of the colour schemes directly)
+    grey = rgb[...,1] if rgb.ndim == 3 else rgb
+    registry = get_registry()
+    for scheme in todo:
+        lut = registry.get(scheme)
+        if isinstance(lut, ColourScheme):
+            out = lut.apply(rgb)
+        elif isinstance(lut, AdaptiveScheme):
+            out = lut.apply(grey)
+        else:
+            out = apply_lut(grey, lut)
+        dst = output_path(filename, scheme, outdir)
+        tmp = dst + '.tmp'
+        save_image(out, tmp, format='JPEG', quality=quality)
+        os.replace(tmp, dst)
+    return len(todo)
+
+
+def run(files, schemes, outdir=None, scheme_paths=(), workers=None, force=False,
+        quality=95, verbose=True):
+    """Enhance ``files`` across a process pool; return (images enhanced, outputs,
+    images failed, seconds). Up-to-date images are not counted as enhanced, and
+    a failed image (the error is printed on stderr) does not stop the others."""
+    if outdir:
+        os.makedirs(outdir, exist_ok=True)
+    t0 = time.perf_counter()
+    nimg = nout = failed = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(list(scheme_paths),)) as pool:
+        futures = {pool.submit(enhance_file, f, schemes, outdir, force, quality): f
+                   for f in files}
+        for fut in as_completed(futures):
+            try:
+                n = fut.result()
+            except Exception as e:
+                print('%s: failed: %s: %s' % (futures[fut], type(e).__name__, e), file=sys.stderr)
+                failed += 1
+                continue
+            nimg += n > 0
+            nout += n
+            if verbose and n:
+                print('%s: %d output(s)' % (futures[fut], n))
+    return nimg, nout, failed, time.perf_counter() - t0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('inputs', nargs='+', help='input images or glob patterns')
+    parser.add_argument('-s', '--schemes', nargs='+', default=['ZA'])
+    parser.add_argument('-o', '--outdir', help='output directory (default: next to the input)')
+    parser.add_argument('--scheme-path', action='append', default=[],
+                        help='scheme directory or file (e.g. BD.csv), may be repeated')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count())
+    parser.add_argument('-f', '--force', action='store_true', help='rewrite up-to-date outputs')
+    parser.add_argument('-q', '--quality', type=int, default=95, help='JPEG quality')
+    args = parser.parse_args(argv)
+
+    files = input_files(parser, args.inputs)
+    # Validate and compile (or load from the cache) every scheme up front
+    _init_worker(args.scheme_path)
+    for scheme in args.schemes:
+        try:
+            get_registry().get(scheme)
+        except (KeyError, ValueError) as e:
+            parser.error(e.args[0])
+
+    nimg, nout, failed, dt = run(files, args.schemes, args.outdir, args.scheme_path,
+                                 args.workers, args.force, args.quality)
+    print('%d image(s) enhanced, %d up to date, %d failed, %d output(s) in %.2f s: %.1f images/s'
+          % (nimg, len(files) - nimg - failed, failed, nout, dt, nimg/dt if dt else 0.))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
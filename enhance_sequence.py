@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Streaming enhancement of frame sequences into a GIF or MP4 loop.
+
+Example::
+
+    python enhance_sequence.py 'frames/se1_b13_*.jpg' -s BD --scheme-path BD.csv -o loop.gif
+
+The scheme is compiled once; frames are decoded (a few ahead, in threads),
+enhanced and handed to the encoder one at a time, so memory does not grow with
+the number of frames (no intermediate JPEGs and no list of PIL images as in
+PRECIPITATIONS.py). GIF frames are written as they come; MP4 goes through
+imageio-ffmpeg.
+"""
+
+import argparse
+import collections
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, GifImagePlugin
+
+from enhancement import ColourScheme, apply_lut, load_image
+from file_inputs import input_files
+from histogram_enhancement import AdaptiveScheme
+from scheme_registry import get_registry
+
+
+class GifStreamWriter(object):
+    """Animated GIF written frame by frame (Pillow keeps every frame until the end)."""
+
+    def __init__(self, filename, duration=200, loop=0):
+        self.fp = open(filename, 'wb')
+        self.duration = duration
+        self.loop = loop
+        self.nframes = 0
+
+    def append(self, arr):
+        im = Image.fromarray(arr)
+        if im.mode not in ('L', 'P'):
+            im = im.quantize(256)
+        if self.nframes == 0:
+            header, _ = GifImagePlugin.getheader(im, None, {'loop': self.loop,
+                                                           'duration': self.duration})
+            for chunk in header:
+                self.fp.write(chunk)
+        # Every frame carries its own colour table: the palettes of quantized
+        # colour frames differ from one frame to the next
+        for chunk in GifImagePlugin.getdata(im, (0, 0), duration=self.duration,
+                                            include_color_table=im.mode == 'P'):
+            self.fp.write(chunk)
+        self.nframes += 1
+
+    def close(self):
+        if not self.fp.closed:
+            self.fp.write(b';')
+            self.fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class VideoWriter(object):
+    """MP4 (or any ffmpeg format) written frame by frame through imageio-ffmpeg."""
+
+    def __init__(self, filename, fps=5):
+        try:
+            import imageio.v2 as imageio
+        except ImportError:
+            raise ImportError('writing videos needs imageio and imageio-ffmpeg '
+                              '(pip install imageio imageio-ffmpeg)')
+        self.writer = imageio.get_writer(filename, fps=fps, macro_block_size=1)
+        self.nframes = 0
+
+    def append(self, arr):
+        self.writer.append_data(arr)
+        self.nframes += 1
+
+    def close(self):
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_writer(filename, duration=200, loop=0):
+    if os.path.splitext(filename)[1].lower() == '.gif':
+        return GifStreamWriter(filename, duration, loop)
+    return VideoWriter(filename, fps=1000./duration)
+
+
+def iter_decoded(files, prefetch=2, channels=None):
+    """Decoded frames in order, at most ``prefetch`` frames decoded ahead."""
+    with ThreadPoolExecutor(max_workers=max(prefetch, 1)) as pool:
+        pending = collections.deque()
+        files = iter(files)
+        for f in files:
+            pending.append(pool.submit(load_image, f, channels))
+            if len(pending) > prefetch:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def enhance_frames(frames, scheme, channel=1):
+    """Enhanced frames (generator) of decoded RGB or grey frames."""
+    lut = get_registry().get(scheme) if isinstance(scheme, str) else scheme
+    for rgb in frames:
+        grey = rgb[..., channel] if rgb.ndim == 3 else rgb
+        if isinstance(lut, ColourScheme):
+            yield lut.apply(rgb)
+        elif isinstance(lut, AdaptiveScheme):
+            yield lut.apply(grey)
+        else:
+            yield apply_lut(grey, lut)
+
+
+def enhance_sequence(files, scheme, output, duration=200, loop=0, prefetch=2):
+    """Enhance ``files`` in order into the animation ``output``; return the frame count."""
+    with open_writer(output, duration, loop) as writer:
+        for frame in enhance_frames(iter_decoded(files, prefetch), scheme):
+            writer.append(frame)
+        return writer.nframes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('inputs', nargs='+', help='frames or glob patterns (sorted by name)')
+    parser.add_argument('-o', '--output', required=True, help='output .gif or .mp4')
+    parser.add_argument('-s', '--scheme', default='ZA')
+    parser.add_argument('--scheme-path', action='append', default=[],
+                        help='scheme directory or file (e.g. BD.csv), may be repeated')
+    parser.add_argument('--duration', type=float, default=200, help='ms per frame')
+    parser.add_argument('--loop', type=int, default=0, help='GIF loops (0: forever)')
+    parser.add_argument('--prefetch', type=int, default=2, help='frames decoded ahead')
+    args = parser.parse_args(argv)
+
+    files = input_files(parser, args.inputs)
+    registry = get_registry()
+    for path in args.scheme_path:
+        registry.add_path(path)
+
+    t0 = time.perf_counter()
+    n = enhance_sequence(files, args.scheme, args.output, args.duration, args.loop, args.prefetch)
+    dt = time.perf_counter() - t0
+    print('%s: %d frame(s) in %.2f s (%.1f frames/s)' % (args.output, n, dt, n/dt if dt else 0.))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Tiled enhancement of images too large for memory (AHI full disk at 500 m).
+
+Example::
+
+    python enhance_tiled.py B03_fulldisk.npy B03_ZA.npy -s ZA --tile-rows 512
+
+The input is read window by window from a memory-mapped NPY or raw file (or a
+GeoTIFF through rasterio), every window is enhanced through the compiled table
+and written straight into the memory-mapped (or GeoTIFF) output, so peak memory
+is bounded by the tile size whatever the image size.
+
+Inputs that are not 8-bit are taken as brightness temperatures
+(``value*scale + offset`` in K) and converted with enhancement.tb_to_count.
+The histogram-based schemes (HE, CLAHE) take two passes over the tiles: one to
+accumulate the histograms, one to apply the interpolated tables.
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+from enhancement import ColourScheme, apply_lut, tb_to_count
+from histogram_enhancement import AdaptiveScheme
+from scheme_registry import get_registry
+
+RAW_EXTENSIONS = ('.raw', '.bin', '.dat')
+TIFF_EXTENSIONS = ('.tif', '.tiff')
+
+
+def _rasterio():
+    try:
+        import rasterio
+    except ImportError:
+        raise ImportError('reading or writing GeoTIFF needs rasterio (pip install rasterio)')
+    return rasterio
+
+
+class ArrayReader(object):
+    """Windows of an array-like (np.memmap, np.ndarray), shape (rows, cols[, bands])."""
+
+    def __init__(self, array):
+        self.array = array
+        self.shape = array.shape
+        self.dtype = array.dtype
+
+    def read(self, rows, cols):
+        return np.asarray(self.array[rows, cols])
+
+    def close(self):
+        pass
+
+
+class TiffReader(object):
+    """Windows of a GeoTIFF, shape (rows, cols[, bands])."""
+
+    def __init__(self, filename):
+        self.ds = _rasterio().open(filename)
+        self.profile = self.ds.profile
+        self.shape = (self.ds.height, self.ds.width) + ((self.ds.count,) if self.ds.count > 1 else ())
+        self.dtype = np.dtype(self.ds.dtypes[0])
+
+    def read(self, rows, cols):
+        from rasterio.windows import Window
+        window = Window(cols.start, rows.start, cols.stop-cols.start, rows.stop-rows.start)
+        data = self.ds.read(window=window)
+        return data[0] if data.shape[0] == 1 else np.moveaxis(data, 0, -1)
+
+    def close(self):
+        self.ds.close()
+
+
+def open_reader(filename, shape=None, dtype=None):
+    """Reader of a NPY (memory-mapped), raw (needs ``shape``/``dtype``) or GeoTIFF file."""
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == '.npy':
+        return ArrayReader(np.load(filename, mmap_mode='r'))
+    if ext in RAW_EXTENSIONS:
+        if shape is None or dtype is None:
+            raise ValueError('a raw input needs its shape and dtype')
+        return ArrayReader(np.memmap(filename, dtype=dtype, mode='r', shape=tuple(shape)))
+    if ext in TIFF_EXTENSIONS:
+        return TiffReader(filename)
+    raise ValueError('%s: unsupported input for tiled processing (npy, raw or GeoTIFF)' % filename)
+
+
+class ArrayWriter(object):
+
+    def __init__(self, array):
+        self.array = array
+
+    def write(self, rows, cols, data):
+        self.array[rows, cols] = data
+
+    def close(self):
+        self.array.flush()
+
+
+class TiffWriter(object):
+
+    def __init__(self, filename, shape, profile=None):
+        profile = dict(profile or {})
+        profile.update(driver='GTiff', height=shape[0], width=shape[1], dtype='uint8',
+                       count=shape[2] if len(shape) > 2 else 1, tiled=True,
+                       blockxsize=256, blockysize=256)
+        profile.pop('nodata', None)
+        self.ds = _rasterio().open(filename, 'w', **profile)
+
+    def write(self, rows, cols, data):
+        from rasterio.windows import Window
+        window = Window(cols.start, rows.start, cols.stop-cols.start, rows.stop-rows.start)
+        if data.ndim == 2:
+            self.ds.write(data, 1, window=window)
+        else:
+            self.ds.write(np.moveaxis(data, -1, 0), window=window)
+
+    def close(self):
+        self.ds.close()
+
+
+def open_writer(filename, shape, profile=None):
+    """uint8 writer of a NPY (memory-mapped), raw or GeoTIFF output of ``shape``."""
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == '.npy':
+        return ArrayWriter(np.lib.format.open_memmap(filename, mode='w+', dtype='uint8',
+                                                     shape=tuple(shape)))
+    if ext in RAW_EXTENSIONS:
+        return ArrayWriter(np.memmap(filename, dtype='uint8', mode='w+', shape=tuple(shape)))
+    if ext in TIFF_EXTENSIONS:
+        return TiffWriter(filename, shape, profile)
+    raise ValueError('%s: unsupported output for tiled processing (npy, raw or GeoTIFF)' % filename)
+
+
+def iter_windows(shape, tile_rows=1024, tile_cols=None):
+    """(rows, cols) slices covering an image of ``shape`` tile by tile."""
+    nrows, ncols = shape[:2]
+    tile_cols = tile_cols or ncols
+    for r0 in range(0, nrows, tile_rows):
+        for c0 in range(0, ncols, tile_cols):
+            yield slice(r0, min(r0+tile_rows, nrows)), slice(c0, min(c0+tile_cols, ncols))
+
+
+def grey_counts(tile, channel=1, scale=1., offset=0.):
+    """8-bit counts of one channel of a tile."""
+    if tile.ndim == 3:
+        # Grey schemes work on one channel (green by default, as Image_ehancement.py)
+        tile = tile[..., channel]
+    if tile.dtype != np.uint8:
+        tile = tb_to_count(tile*scale + offset)
+    return tile
+
+
+def enhance_tile(tile, lut, channel=1, scale=1., offset=0.):
+    """Enhance one tile with a grey table or a ColourScheme."""
+    if isinstance(lut, ColourScheme):
+        return lut.apply(tile, scale, offset)
+    return apply_lut(grey_counts(tile, channel, scale, offset), lut)
+
+
+def output_shape(shape, lut):
+    if isinstance(lut, ColourScheme):
+        return tuple(shape[:2]) + (3,)
+    return tuple(shape[:2])
+
+
+def enhance_tiled(src, dst, scheme, tile_rows=1024, tile_cols=None, channel=1,
+                  scale=1., offset=0., shape=None, dtype=None):
+    """Enhance the file ``src`` into ``dst`` tile by tile; return the output shape."""
+    lut = get_registry().get(scheme) if isinstance(scheme, str) else scheme
+    reader = open_reader(src, shape, dtype)
+    try:
+        oshape = output_shape(reader.shape, lut)
+        model = None
+        if isinstance(lut, AdaptiveScheme):
+            # First pass: histograms of the whole image
+            model = lut.model(reader.shape)
+            for rows, cols in iter_windows(reader.shape, tile_rows, tile_cols):
+                model.update(grey_counts(reader.read(rows, cols), channel, scale, offset),
+                             rows, cols)
+            model.finalize()
+        writer = open_writer(dst, oshape, getattr(reader, 'profile', None))
+        try:
+            for rows, cols in iter_windows(reader.shape, tile_rows, tile_cols):
+                tile = reader.read(rows, cols)
+                if model is not None:
+                    out = model.transform(grey_counts(tile, channel, scale, offset), rows, cols)
+                else:
+                    out = enhance_tile(tile, lut, channel, scale, offset)
+                writer.write(rows, cols, out)
+        finally:
+            writer.close()
+    finally:
+        reader.close()
+    return oshape
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('input', help='npy, raw or GeoTIFF input')
+    parser.add_argument('output', help='npy, raw or GeoTIFF output (uint8)')
+    parser.add_argument('-s', '--scheme', default='ZA')
+    parser.add_argument('--scheme-path', action='append', default=[],
+                        help='scheme directory or file (e.g. BD.csv), may be repeated')
+    parser.add_argument('--tile-rows', type=int, default=1024)
+    parser.add_argument('--tile-cols', type=int, default=None)
+    parser.add_argument('--channel', type=int, default=1, help='channel of a multi-band input')
+    parser.add_argument('--shape', type=int, nargs='+', help='shape of a raw input')
+    parser.add_argument('--dtype', help='dtype of a raw input (e.g. uint16)')
+    parser.add_argument('--scale', type=float, default=1., help='K per input unit')
+    parser.add_argument('--offset', type=float, default=0., help='K at input 0')
+    args = parser.parse_args(argv)
+
+    registry = get_registry()
+    for path in args.scheme_path:
+        registry.add_path(path)
+    oshape = enhance_tiled(args.input, args.output, args.scheme, args.tile_rows,
+                           args.tile_cols, args.channel, args.scale, args.offset,
+                           args.shape, args.dtype)
+    print('%s: %s %s' % (args.output, args.scheme, 'x'.join(map(str, oshape))))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
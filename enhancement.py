@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Lookup-table engine for the image enhancement schemes.
+
+Every scheme of Image_ehancement.py maps an 8-bit input count to an 8-bit
+output count, so it can be compiled once into a 256-entry uint8 table and
+applied to a whole image with a single gather.
+
+- Enhancement scheme: https://www.ospo.noaa.gov/Organization/FAQ/enhancements.html
+"""
+
+import numpy as np
+from PIL import Image
+
+# Input counts of an 8-bit image
+COUNTS = np.arange(256)
+
+
+def linear_reg(x1,x2,y1,y2):
+    """Coefficients (a, b) of the line through (x1, y1) and (x2, y2)."""
+    a = (y2-y1)/float(x2-x1)
+    b = y1 - a*x1
+    return a,b
+
+
+def _to_uint8(values):
+    # int() truncation followed by the 0..255 clamp of the original loops
+    return np.clip(np.trunc(values), 0, 255).astype('uint8')
+
+
+def lut_shift(offset):
+    """Table shifting every count by ``offset``, saturating at 0 and 255."""
+    return _to_uint8(COUNTS + offset)
+
+
+def lut_linear(a, b):
+    """Table of the line ``a*x + b`` clamped to 0..255."""
+    return _to_uint8(a*COUNTS.astype('float64') + b)
+
+
+def lut_piecewise(x, y):
+    """Table of the piecewise-linear scheme given by the breakpoints ``x``/``y``.
+
+    The segment of a count ``v`` is the first breakpoint strictly above it,
+    exactly as the ``while`` search of the original loops; counts beyond the
+    last breakpoint extend the last segment.
+    """
+    x = np.asarray(x, 'float64')
+    y = np.asarray(y, 'float64')
+    if x.ndim != 1 or x.shape != y.shape or len(x) < 2:
+        raise ValueError('x and y must be 1-D sequences of the same length (>= 2)')
+    if np.any(np.diff(x) < 0):
+        raise ValueError('breakpoints x must be non-decreasing')
+
+    i = np.clip(np.searchsorted(x, COUNTS, side='right'), 1, len(x)-1)
+    x1, x2, y1, y2 = x[i-1], x[i], y[i-1], y[i]
+    if np.any(x2 == x1):
+        raise ValueError('a vertical segment of the scheme is used for a count')
+    a = (y2-y1)/(x2-x1)
+    b = y1 - a*x1
+    return _to_uint8(a*COUNTS + b)
+
+
+# Built-in parametric schemes of Image_ehancement.py; the user-defined curves
+# (ZA, MB, BD, ...) are scheme files loaded through scheme_registry.py
+SCHEMES = {
+    'ln_up': lambda: lut_shift(50),
+    'ln_dn': lambda: lut_shift(-50),
+    'more_contrast': lambda: lut_linear(*linear_reg(75,100,0,255)),
+    'less_contrast': lambda: lut_linear(*linear_reg(0,255,75,100)),
+}
+
+_compiled = {}
+
+
+def get_lut(name):
+    """Compiled table of a built-in scheme (compiled on first use)."""
+    if name not in _compiled:
+        try:
+            builder = SCHEMES[name]
+        except KeyError:
+            raise KeyError('unknown enhancement scheme %r (available: %s)'
+                           % (name, ', '.join(sorted(SCHEMES))))
+        lut = builder()
+        lut.flags.writeable = False
+        _compiled[name] = lut
+    return _compiled[name]
+
+
+def apply_lut(img, lut, out=None):
+    """Enhance an 8-bit image (any shape) through a 256-entry table."""
+    img = np.asarray(img)
+    if img.dtype != np.uint8:
+        raise TypeError('expected an uint8 image, got %s' % img.dtype)
+    return np.take(lut, img, out=out)
+
+
+def load_image(filename, channels=None):
+    """Decode an image into a row-major (rows, cols[, bands]) array.
+
+    ``channels`` selects band(s) without copying: an int gives a 2-D view of one
+    band (e.g. 1 for the green channel used by the grey schemes), a list or a
+    slice a 3-D view. Grey and RGB images are returned as they are; other modes
+    (palette, alpha, CMYK...) are converted to RGB (grey with alpha to grey).
+    """
+    img = Image.open(filename)
+    if img.mode not in ('L', 'RGB'):
+        img = img.convert('L' if img.mode == 'LA' else 'RGB')
+    arr = np.asarray(img)
+    if channels is None or arr.ndim == 2:
+        return arr
+    if isinstance(channels, (list, tuple)):
+        if list(channels) == list(range(channels[0], channels[-1]+1)):
+            channels = slice(channels[0], channels[-1]+1)
+        else:
+            return arr[..., list(channels)]     # non-contiguous selection: copy
+    return arr[..., channels]
+
+
+def save_image(arr, filename, **kwargs):
+    """Encode a row-major uint8 array (rows, cols[, 3]) to an image file."""
+    Image.fromarray(np.ascontiguousarray(arr)).save(filename, **kwargs)
+
+
+def enhance(img, scheme):
+    """Apply a built-in scheme (by name) or a compiled table to an image."""
+    lut = get_lut(scheme) if isinstance(scheme, str) else np.asarray(scheme, 'uint8')
+    return apply_lut(img, lut)
+
+
+# Columns of the three-channel (BD-like) scheme files: input segment [x1, x2]
+# and the output segment of the blue, green and red channels
+BD_COLUMNS = ['x1','x2','yb1','yb2','yg1','yg2','yr1','yr2']
+
+
+def read_table(filename):
+    """Read a numeric scheme table (whitespace, ';' or ',' separated).
+
+    Lines starting with '#' are comments and a first non-numeric line is taken
+    as the header. Returns (header or None, integer array).
+    """
+    rows = []
+    header = None
+    with open(filename, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            temp = line.replace(';', ' ').replace(',', ' ').split()
+            try:
+                values = [int(float(t)) for t in temp]
+            except ValueError:
+                if header is None and not rows:
+                    header = temp
+                    continue
+                raise ValueError('%s: cannot parse line %r' % (filename, line))
+            if rows and len(values) != len(rows[0]):
+                raise ValueError('%s: inconsistent number of columns' % filename)
+            rows.append(values)
+    if not rows:
+        raise ValueError('%s: empty enhancement scheme' % filename)
+    return header, np.array(rows, 'int64')
+
+
+def read_segment_table(filename):
+    """Read a three-channel scheme (``BD.csv`` with ';' and a header, or ``BD.txt``).
+
+    Returns an integer array of shape (nsegments, 8) ordered as BD_COLUMNS.
+    """
+    header, table = read_table(filename)
+    if header is not None:
+        try:
+            table = table[:, [header.index(c) for c in BD_COLUMNS]]
+        except ValueError:
+            raise ValueError('%s: expected the columns %s' % (filename, BD_COLUMNS))
+    if table.shape[1] != len(BD_COLUMNS):
+        raise ValueError('%s: expected %d columns' % (filename, len(BD_COLUMNS)))
+    return table
+
+
+def tb_to_count(tb):
+    """8-bit IR count of a brightness temperature (K), GOES mode-A convention.
+
+    Colder than 242 K: one count per K (255 at 163 K); warmer: two counts per K
+    (0 at 330 K). NaN maps to 0.
+    """
+    tb = np.asarray(tb, 'float64')
+    count = np.where(tb <= 242, 418 - tb, 660 - 2*tb)
+    count = np.nan_to_num(count, nan=0.)
+    return np.clip(np.rint(count), 0, 255).astype('uint8')
+
+
+class ColourScheme(object):
+    """Three-channel scheme (e.g. Dvorak BD) compiled into lookup tables.
+
+    The segment is chosen on the green (selector) count and the line of that
+    segment is applied to the count of each channel, as in the original loops.
+    ``lut[c, s, v]`` holds the output of channel c (0=red, 1=green, 2=blue) for
+    selector s and input v; ``palette[v]`` is the RGB colour of a grey input v.
+    """
+
+    def __init__(self, table, name='BD', lut=None):
+        table = np.asarray(table, 'int64')
+        self.name = name
+        self.table = table
+        if lut is None:
+            lut = self.compile(table, name)
+        self.lut = lut
+        self.palette = np.ascontiguousarray(self.lut[:, COUNTS, COUNTS].T)
+        self._flat = self.lut.reshape(3, -1)
+        self._count_luts = {}
+
+    @staticmethod
+    def compile(table, name='BD'):
+        """Table (3, 256, 256) of a (nsegments, 8) segment table."""
+        x1, x2 = table[:,0], table[:,1]
+        if np.any(x2 == x1):
+            raise ValueError('%s: segment with x1 == x2' % name)
+
+        # Segment of every selector count: first one with count <= x2
+        seg = np.searchsorted(np.maximum.accumulate(x2), COUNTS, side='left')
+        seg = np.minimum(seg, len(table)-1)
+
+        lut = np.empty((3,256,256), 'uint8')
+        for c, col in enumerate((6, 4, 2)):    # red, green, blue columns
+            y1, y2 = table[seg,col], table[seg,col+1]
+            a = (y2-y1)/(x2[seg]-x1[seg]).astype('float64')
+            b = y1 - a*x1[seg]
+            lut[c] = _to_uint8(a[:,None]*COUNTS[None,:] + b[:,None])
+        return lut
+
+    @classmethod
+    def from_file(cls, filename, name=None):
+        if name is None:
+            name = filename.rsplit('/', 1)[-1].rsplit('.', 1)[0]
+        return cls(read_segment_table(filename), name)
+
+    def counts(self, img, scale=1., offset=0.):
+        """8-bit counts of a non-8-bit image (brightness temperature = img*scale + offset)."""
+        img = np.asarray(img)
+        if img.dtype == np.uint8:
+            return img
+        if img.dtype.kind in 'ui' and img.dtype.itemsize <= 2:
+            # Quantized input (e.g. 16-bit): one table entry per possible value
+            info = np.iinfo(img.dtype)
+            key = (img.dtype.str, scale, offset)
+            if key not in self._count_luts:
+                values = np.arange(info.min, info.max+1)
+                self._count_luts[key] = tb_to_count(values*scale + offset)
+            if info.min:
+                img = img.astype('int32') - info.min
+            return np.take(self._count_luts[key], img)
+        return tb_to_count(img*scale + offset)
+
+    def apply(self, img, scale=1., offset=0.):
+        """RGB composite (rows, cols, 3) of an image.
+
+        - uint8 (rows, cols, 3): per-channel enhancement selected on the green channel
+        - uint8 (rows, cols): grey counts, looked up in the palette
+        - other dtypes: brightness temperatures in K (``img*scale + offset``)
+        """
+        img = np.asarray(img)
+        if img.ndim == 3:
+            if img.dtype != np.uint8 or img.shape[2] < 3:
+                raise TypeError('expected an 8-bit RGB image')
+            sel = img[...,1].astype('intp') << 8
+            out = np.empty(img.shape[:2] + (3,), 'uint8')
+            for c in range(3):
+                np.take(self._flat[c], sel + img[...,c], out=out[...,c])
+            return out
+        return np.take(self.palette, self.counts(img, scale, offset), axis=0)
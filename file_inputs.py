@@ -0,0 +1,24 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Input files of the command-line tools, given as file names or glob patterns.
+
+Example::
+
+    files = input_files(parser, args.inputs)
+"""
+
+import glob
+
+
+def expand_inputs(patterns):
+    """Sorted unique files matching file names or glob patterns."""
+    return sorted(set(f for pattern in patterns for f in glob.glob(pattern)))
+
+
+def input_files(parser, patterns):
+    """Files of ``patterns``; exit through ``parser.error`` when nothing matches."""
+    files = expand_inputs(patterns)
+    if not files:
+        parser.error('no input matches %s' % ' '.join(patterns))
+    return files
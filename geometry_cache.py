@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""On-disk cache of the static map geometry (Basemap, projected meshes, Natural Earth).
+
+Building a Basemap at 'i' resolution (reading and clipping the GSHHS
+coastlines and borders), projecting the lat/lon mesh of a grid, and reading
+the Natural Earth shapefiles of cartopy take seconds, and PRECIPITATIONS.py
+and CYCLONES.py redo it for every plot of the same domain. The objects are
+pickled once under a key made of the bounding box, the projection and the
+resolution (``GEOMETRY_CACHE_DIR``, by default
+``~/.cache/remote-sensing-atmosphere/geometry``) and kept in memory, so later
+renders of the domain load them in milliseconds, without network access.
+
+Populate the cache of a domain ahead of offline work::
+
+    python geometry_cache.py --lat 0 30 --lon 100 140 --natural-earth
+"""
+
+import argparse
+import hashlib
+import os
+import pickle
+import sys
+import time
+import warnings
+
+import numpy as np
+
+CACHE_DIR = os.environ.get('GEOMETRY_CACHE_DIR',
+                           os.path.join(os.path.expanduser('~'), '.cache',
+                                        'remote-sensing-atmosphere', 'geometry'))
+
+# Bumped whenever the layout of the cached objects changes
+_CACHE_VERSION = b'1'
+
+# Natural Earth features drawn by CYCLONES.py (category, name)
+BORDERS = ('cultural', 'admin_0_boundary_lines_land')
+COASTLINE = ('physical', 'coastline')
+
+_memory = {}
+
+
+def cache_key(kind, *parts):
+    """File name stem of a cached object: kind and hash of its key parts."""
+    digest = hashlib.sha256(_CACHE_VERSION + repr(parts).encode()).hexdigest()[:16]
+    return '%s-%s' % (kind, digest)
+
+
+def cached(kind, parts, build, cache_dir=CACHE_DIR):
+    """Object of key (kind, parts) from memory, then disk, else ``build()`` and store it."""
+    key = cache_key(kind, *parts)
+    if key in _memory:
+        return _memory[key]
+    path = os.path.join(cache_dir, key + '.pkl') if cache_dir else None
+    if path and os.path.exists(path):
+        try:
+            with open(path, 'rb') as f:
+                _memory[key] = pickle.load(f)
+            return _memory[key]
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            pass    # corrupted or stale cache entry: build again
+
+    obj = build()
+    if path:
+        tmp = path + '.%d.tmp' % os.getpid()
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(tmp, 'wb') as f:
+                pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except Exception as e:
+            # Unpicklable objects raise TypeError, AttributeError... : keep the
+            # object in memory only
+            warnings.warn('cannot cache the %s geometry: %s' % (kind, e))
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+    _memory[key] = obj
+    return obj
+
+
+def _bounds(latbounds, lonbounds):
+    return (float(min(latbounds)), float(max(latbounds)),
+            float(min(lonbounds)), float(max(lonbounds)))
+
+
+def basemap(latbounds, lonbounds, projection='merc', resolution='i', **kw):
+    """Basemap of the region (Mercator true at the mid latitude by default), cached."""
+    latmin, latmax, lonmin, lonmax = _bounds(latbounds, lonbounds)
+    if projection == 'merc':
+        kw.setdefault('lat_ts', latmin+(latmax-latmin)/float(2))
+
+    def build():
+        from mpl_toolkits.basemap import Basemap
+        return Basemap(projection=projection, llcrnrlat=latmin, urcrnrlat=latmax,
+                       llcrnrlon=lonmin, urcrnrlon=lonmax, resolution=resolution, **kw)
+
+    return cached('basemap', (projection, resolution, latmin, latmax, lonmin, lonmax,
+                              sorted(kw.items())), build)
+
+
+def grid_digest(lons, lats):
+    """Hash of the 1-D coordinates of a lat/lon grid (part of the cache keys)."""
+    lons = np.ascontiguousarray(lons, 'float64')
+    lats = np.ascontiguousarray(lats, 'float64')
+    return hashlib.sha256(lons.tobytes() + b'|' + lats.tobytes()).hexdigest()[:16]
+
+
+def projected_mesh(lons, lats, latbounds, lonbounds, projection='merc', resolution='i', **kw):
+    """Projected (x, y) mesh of a lat/lon grid on the Basemap of the region, cached."""
+    grid = grid_digest(lons, lats)
+
+    def build():
+        m = basemap(latbounds, lonbounds, projection, resolution, **kw)
+        lonsmesh, latsmesh = np.meshgrid(lons, lats)
+        return m(lonsmesh, latsmesh)
+
+    return cached('mesh', (projection, resolution, _bounds(latbounds, lonbounds),
+                           sorted(kw.items()), grid), build)
+
+
+def natural_earth(category, name, scale='50m', extent=None, **kwargs):
+    """Cartopy feature of the Natural Earth geometries intersecting ``extent``, cached.
+
+    ``extent`` is (lonmin, lonmax, latmin, latmax) as in cartopy (None: whole
+    globe); ``kwargs`` are the style of the feature (edgecolor...).
+    """
+    import cartopy.crs as ccrs
+    import cartopy.feature as cfeature
+
+    extent = tuple(float(v) for v in extent) if extent is not None else None
+
+    def build():
+        feature = cfeature.NaturalEarthFeature(category, name, scale)
+        if extent is None:
+            return list(feature.geometries())
+        return list(feature.intersecting_geometries(extent))
+
+    geoms = cached('naturalearth', (category, name, scale, extent), build)
+    kwargs.setdefault('facecolor', 'none')
+    return cfeature.ShapelyFeature(geoms, ccrs.PlateCarree(), **kwargs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--lat', type=float, nargs=2, default=[0., 30.])
+    parser.add_argument('--lon', type=float, nargs=2, default=[100., 140.])
+    parser.add_argument('--projection', default='merc')
+    parser.add_argument('--resolution', default='i', help="Basemap resolution (c, l, i, h, f)")
+    parser.add_argument('--natural-earth', action='store_true',
+                        help='also cache the 50m borders and coastline of the region (cartopy)')
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    basemap(args.lat, args.lon, args.projection, args.resolution)
+    print('basemap: %.3f s' % (time.perf_counter() - t0))
+    if args.natural_earth:
+        extent = (min(args.lon), max(args.lon), min(args.lat), max(args.lat))
+        for category, name in (BORDERS, COASTLINE):
+            t0 = time.perf_counter()
+            natural_earth(category, name, '50m', extent)
+            print('%s: %.3f s' % (name, time.perf_counter() - t0))
+    print('cache: %s' % CACHE_DIR)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
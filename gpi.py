@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""GOES Precipitation Index (Arkin threshold method) accumulated over GRIDSAT-B1 files.
+
+The other estimators of rain_estimators.py (cloud indexing, autoestimator,
+NAW) run through the same engine with ``--estimator``.
+
+$$ Precipitation (mm) = FRAC * RATE * TIME $$
+
+- *FRAC*: fractional coverage of IR pixels < 235K over a large domain (> 50km x 50km)
+- *RATE*: 3mm/h
+- *TIME*: number of hours over which *FRAC* was compiled (3 h per GRIDSAT-B1 file)
+
+http://tao.atmos.washington.edu/data_sets/gpi/
+
+Example::
+
+    python gpi.py 'data_GRIDSAT/GRIDSAT-B1.2013.11.*.nc' -o haiyan_gpi_daily.nc --period daily
+
+The files are processed in parallel (one file per task); each task returns the
+GPI rainfall of its file on the coarse box grid and only the running sums of
+the daily/pentad totals are kept in memory.
+"""
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+import xarray as xr
+
+from block_stats import GPI_THRESHOLD, block_fraction, block_mean, block_mean_coord
+from file_inputs import input_files
+from gridsat import KM_PER_DEGREE, LATBOUNDS, LONBOUNDS, file_time, open_gridsat, select_region
+from rain_estimators import ESTIMATORS, get_estimator, rain_rate
+
+GPI_RATE = 3.           # mm/h
+GRIDSAT_HOURS = 3.      # hours covered by one GRIDSAT-B1 file
+
+
+def box_pixels(lat, box_km=50.):
+    """Number of grid pixels per side of a box of at least ``box_km``."""
+    res_km = abs(float(lat[1]) - float(lat[0]))*KM_PER_DEGREE
+    return max(1, int(np.ceil(box_km/res_km)))
+
+
+def cold_fraction(tb, box, threshold=GPI_THRESHOLD, partial=False):
+    """Fraction of valid pixels colder than ``threshold`` in ``box`` x ``box`` blocks.
+
+    ``tb`` is a (lat, lon) DataArray. Partial blocks at the edges, smaller than
+    the GPI domain, are dropped unless ``partial`` is set.
+    """
+    frac = block_fraction(tb.values, box, threshold=threshold, partial=partial)
+    return xr.DataArray(frac, dims=('lat', 'lon'), name='frac',
+                        coords={'lat': block_mean_coord(tb.lat.values, box, partial),
+                                'lon': block_mean_coord(tb.lon.values, box, partial)})
+
+
+def gpi_rain(frac, hours=GRIDSAT_HOURS, rate=GPI_RATE):
+    """GPI rainfall (mm) of a cold-cloud fraction compiled over ``hours``."""
+    return frac*rate*hours
+
+
+def period_start(time, period='daily'):
+    """Start of the daily or pentad (5-day, from 1 January) period of ``time``."""
+    day = datetime(time.year, time.month, time.day)
+    if period == 'daily':
+        return day
+    if period == 'pentad':
+        doy = day.timetuple().tm_yday - 1
+        # The last pentad of the year takes the 31 December of leap years
+        return datetime(time.year, 1, 1) + timedelta(days=5*min(doy//5, 72))
+    raise ValueError('unknown period %r (daily or pentad)' % period)
+
+
+def file_rain(filename, latbounds=LATBOUNDS, lonbounds=LONBOUNDS, box_km=50.,
+              hours=GRIDSAT_HOURS, var='ir', estimator='gpi'):
+    """Rainfall (mm) of one file on the box grid, as a (lat, lon) DataArray.
+
+    The box value is the mean rain rate of the valid pixels times ``hours``;
+    for the GPI, FRAC * 3 mm/h * hours.
+    """
+    est = get_estimator(estimator) if isinstance(estimator, str) else estimator
+    with open_gridsat(filename) as ds:
+        tb = select_region(ds, var, latbounds, lonbounds).squeeze(drop=True)
+        # A time step of a store (dask arrays) is not loaded: its rates are
+        # computed chunk by chunk
+        if tb.chunks is None:
+            tb = tb.load()
+        rate = rain_rate(tb, est).values
+    box = box_pixels(tb.lat.values, box_km)
+    return xr.DataArray(block_mean(rate, box, partial=False)*hours, dims=('lat', 'lon'),
+                        name=est.name,
+                        coords={'lat': block_mean_coord(tb.lat.values, box, False),
+                                'lon': block_mean_coord(tb.lon.values, box, False)})
+
+
+def _task(args):
+    filename, kw = args
+    rain = file_rain(filename, **kw)
+    return file_time(filename), rain.lat.values, rain.lon.values, rain.values
+
+
+def accumulate(files, period='daily', latbounds=LATBOUNDS, lonbounds=LONBOUNDS,
+               box_km=50., hours=GRIDSAT_HOURS, workers=None, estimator='gpi'):
+    """Rainfall totals (mm) per period over ``files`` as an xarray Dataset.
+
+    The totals are in the variable named after the estimator (``gpi``...).
+    ``nfiles`` counts the files of each period and ``nvalid`` the files with a
+    valid value in each box.
+    """
+    kw = dict(latbounds=latbounds, lonbounds=lonbounds, box_km=box_km, hours=hours,
+              estimator=estimator)
+    sums = {}
+    lat = lon = None
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for time, lat, lon, rain in pool.map(_task, [(f, kw) for f in files]):
+            key = period_start(time, period)
+            if key not in sums:
+                sums[key] = [np.zeros(rain.shape), np.zeros(rain.shape, 'int32'), 0]
+            acc = sums[key]
+            valid = np.isfinite(rain)
+            acc[0] += np.where(valid, rain, 0.)
+            acc[1] += valid
+            acc[2] += 1
+    if not sums:
+        raise ValueError('no input file')
+
+    times = sorted(sums)
+    total = np.stack([np.where(sums[t][1] > 0, sums[t][0], np.nan) for t in times])
+    return xr.Dataset(
+        {estimator: (('time','lat','lon'), total.astype('float32'),
+                     {'units': 'mm', 'long_name': '%s rainfall (%s total)' % (estimator, period)}),
+         'nvalid': (('time','lat','lon'), np.stack([sums[t][1] for t in times]),
+                    {'long_name': 'number of files with a valid value'}),
+         'nfiles': (('time',), np.array([sums[t][2] for t in times], 'int32'),
+                    {'long_name': 'number of files in the period'})},
+        coords={'time': times, 'lat': lat, 'lon': lon},
+        attrs={'title': '%s rainfall from GRIDSAT-B1 IR' % estimator, 'estimator': estimator,
+               'hours_per_file': hours, 'box_km': box_km, 'period': period})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('inputs', nargs='+', help='GRIDSAT-B1 files or glob patterns')
+    parser.add_argument('-o', '--output', required=True, help='output NetCDF file')
+    parser.add_argument('--period', choices=['daily', 'pentad'], default='daily')
+    parser.add_argument('--estimator', choices=sorted(ESTIMATORS), default='gpi')
+    parser.add_argument('--box-km', type=float, default=50.)
+    parser.add_argument('--lat', type=float, nargs=2, default=LATBOUNDS)
+    parser.add_argument('--lon', type=float, nargs=2, default=LONBOUNDS)
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args(argv)
+
+    files = input_files(parser, args.inputs)
+    ds = accumulate(files, args.period, args.lat, args.lon, args.box_km, workers=args.workers,
+                    estimator=args.estimator)
+    ds.to_netcdf(args.output, encoding={args.estimator: {'zlib': True}, 'nvalid': {'zlib': True}})
+    print('%s: %d file(s), %d %s total(s)' % (args.output, len(files), ds.sizes['time'], args.period))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Lazy, region-first reading of GRIDSAT-B1 files.
+
+- data: https://www.ncei.noaa.gov/products/gridded-geostationary-brightness-temperature
+
+The files are opened lazily (no variable is read at open) and the lat/lon
+bounding box is converted once per grid into integer index slices, so only the
+bytes of the region of interest of the chosen channel are read and decoded::
+
+    dat = read_region('GRIDSAT-B1.2013.11.07.12.v02r01.nc', 'ir', [0,30], [100,140])
+
+The same functions open the time-indexed Zarr stores of gridsat_store.py
+(``read_region('gridsat.zarr', 'ir', time=slice('2013-11-07', '2013-11-09'))``).
+When the ``GRIDSAT_STORE`` environment variable names a store, a
+GRIDSAT-B1.YYYY.MM.DD.HH file name that is not on disk is read from the store
+at the time of its name, so the per-file loaders work unchanged.
+"""
+
+import os
+import re
+from datetime import datetime
+
+import numpy as np
+import xarray as xr
+
+# Channel names of PRECIPITATIONS.py and their GRIDSAT-B1 variables
+VARIABLES = {
+    'vis': 'vschn',
+    'ir': 'irwin_cdr',
+    'wv': 'irwvp',
+}
+
+# Region of interest of PRECIPITATIONS.py (Haiyan)
+LATBOUNDS = [0,30]
+LONBOUNDS = [100,140]
+
+KM_PER_DEGREE = 111.2   # km per degree of latitude
+
+# Default colour range of the channels (Tb in K) and of the GPI rainfall (mm per
+# 3-hourly file), fixed for all the frames of an animation
+CLIMS = {'ir': (180., 310.), 'wv': (190., 260.), 'vis': (0., 1.), 'gpi': (0., 9.)}
+
+# Store read in place of missing GRIDSAT-B1 files (gridsat_store.py)
+STORE = os.environ.get('GRIDSAT_STORE')
+
+_FILE_TIME = re.compile(r'(\d{4})\.(\d{2})\.(\d{2})\.(\d{2})')
+
+_slices = {}
+
+
+def variable_name(var):
+    """GRIDSAT-B1 variable of a channel ('vis', 'ir', 'wv') or of a variable name."""
+    return VARIABLES.get(var, var)
+
+
+def file_time(filename):
+    """Time of a GRIDSAT-B1.YYYY.MM.DD.HH.v02r01.nc file."""
+    m = _FILE_TIME.search(os.path.basename(filename))
+    if m is None:
+        raise ValueError('%s: no YYYY.MM.DD.HH time in the file name' % filename)
+    return datetime(*map(int, m.groups()))
+
+
+def open_gridsat(filename, chunks=None):
+    """Open a GRIDSAT-B1 file (or a gridsat_store.py store) lazily.
+
+    Without ``chunks`` the variables stay lazily indexed arrays of the backend:
+    indexing reads only the selected slab. With ``chunks`` (e.g.
+    ``{'lat': 500, 'lon': 500}``) they are dask arrays.
+    """
+    from gridsat_store import is_store, open_store
+    if is_store(filename):
+        return open_store(filename, chunks)
+    if STORE and not os.path.exists(filename):
+        # Time step of the store, with the length-1 time axis of the file
+        return open_store(STORE, chunks).sel(time=[file_time(filename)])
+    return xr.open_dataset(filename, chunks=chunks, cache=False)
+
+
+def _index_slice(coord, vmin, vmax):
+    # Inclusive [vmin, vmax] as an index slice, like .sel(slice(vmin, vmax))
+    if coord[0] <= coord[-1]:
+        i0 = np.searchsorted(coord, vmin, side='left')
+        i1 = np.searchsorted(coord, vmax, side='right')
+    else:
+        # Descending coordinate
+        rev = coord[::-1]
+        i0 = len(coord) - np.searchsorted(rev, vmax, side='right')
+        i1 = len(coord) - np.searchsorted(rev, vmin, side='left')
+    return slice(int(i0), int(i1))
+
+
+def _grid_key(coord):
+    return (coord.size, float(coord[0]), float(coord[-1]))
+
+
+def region_slices(lat, lon, latbounds=LATBOUNDS, lonbounds=LONBOUNDS):
+    """(lat, lon) index slices of a bounding box, cached per grid and box."""
+    lat = np.asarray(lat)
+    lon = np.asarray(lon)
+    key = (_grid_key(lat), _grid_key(lon),
+           min(latbounds), max(latbounds), min(lonbounds), max(lonbounds))
+    if key not in _slices:
+        _slices[key] = (_index_slice(lat, min(latbounds), max(latbounds)),
+                        _index_slice(lon, min(lonbounds), max(lonbounds)))
+    return _slices[key]
+
+
+def select_region(ds, var='ir', latbounds=LATBOUNDS, lonbounds=LONBOUNDS, time=None):
+    """Region of interest of one channel of an open dataset (still lazy).
+
+    ``time`` (a time, a list or a slice) selects time steps, e.g. of a store.
+    """
+    latslice, lonslice = region_slices(ds['lat'].values, ds['lon'].values, latbounds, lonbounds)
+    dat = ds[variable_name(var)].isel(lat=latslice, lon=lonslice)
+    if time is not None:
+        dat = dat.sel(time=time)
+    return dat
+
+
+def read_region(filename, var='ir', latbounds=LATBOUNDS, lonbounds=LONBOUNDS, chunks=None,
+                time=None):
+    """Region of interest of one channel of a GRIDSAT-B1 file (or store), loaded in memory."""
+    with open_gridsat(filename, chunks) as ds:
+        return select_region(ds, var, latbounds, lonbounds, time).load()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Parallel rendering of GRIDSAT-B1 animations (Haiyan timelapse of PRECIPITATIONS.py).
+
+Example::
+
+    python gridsat_animation.py 'data_GRIDSAT/GRIDSAT-B1.2013.11.07.*.nc' -v ir \\
+        -o haiyan_typhoon_timelapse_ir.gif
+
+Every worker process builds the map once: the Basemap projection, the
+coastlines and countries, the projected mesh of the grid (both loaded from
+geometry_cache.py), the pcolormesh and the colorbar. A frame then only reads
+the region of interest of its file, updates the data of the mesh and the
+title, and returns the rendered pixels.
+The frames are streamed in order into the GIF (no intermediate JPEG files) and
+the figures are reused, so memory does not grow with the number of frames.
+"""
+
+import argparse
+import collections
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from enhance_sequence import open_writer
+from file_inputs import input_files
+from geometry_cache import basemap, projected_mesh
+from gridsat import CLIMS, LATBOUNDS, LONBOUNDS, open_gridsat, read_region, region_slices
+
+_frame = None
+
+
+class FrameRenderer(object):
+    """Map of a region built once; ``render`` only swaps the data."""
+
+    def __init__(self, lons, lats, latbounds=LATBOUNDS, lonbounds=LONBOUNDS,
+                 clim=None, cmap='rainbow', figsize=(10,8), dpi=80):
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+
+        latmin, latmax = min(latbounds), max(latbounds)
+        lonmin, lonmax = min(lonbounds), max(lonbounds)
+        self.fig = plt.figure(figsize=figsize, dpi=dpi)
+        # Basemap and projected mesh come from the geometry cache
+        m = basemap(latbounds, lonbounds)
+
+        # Draw parrallels and meridians
+        m.drawparallels(np.arange(latmin,latmax,3), labels=[1,0,0,0], fontsize=14)
+        m.drawmeridians(np.arange(lonmin,lonmax,3), labels=[0,0,0,1], fontsize=14)
+        m.drawcoastlines(linewidth=1)
+        m.drawcountries(linewidth=1)
+
+        x,y = projected_mesh(lons, lats, latbounds, lonbounds)
+        self.shape = x.shape
+        self.mesh = m.pcolormesh(x, y, np.ma.masked_all(self.shape), cmap=cmap, shading='auto',
+                                 vmin=clim[0] if clim else None, vmax=clim[1] if clim else None)
+        m.colorbar(self.mesh)
+        self.title = plt.title('')
+
+    def render(self, data, title=''):
+        """RGB pixels (rows, cols, 3) of the map of ``data``."""
+        data = np.ma.masked_invalid(np.squeeze(data))
+        if data.shape != self.shape:
+            raise ValueError('frame of shape %s on a grid of shape %s' % (data.shape, self.shape))
+        self.mesh.set_array(data)
+        self.title.set_text(title)
+        self.fig.canvas.draw()
+        return np.asarray(self.fig.canvas.buffer_rgba())[..., :3].copy()
+
+
+def _init_worker(lons, lats, latbounds, lonbounds, clim, cmap):
+    global _frame
+    _frame = FrameRenderer(lons, lats, latbounds, lonbounds, clim, cmap)
+
+
+def _render_file(args):
+    filename, var, latbounds, lonbounds = args
+    dat = read_region(filename, var, latbounds, lonbounds)
+    title = os.path.splitext(os.path.basename(filename))[0]
+    return _frame.render(dat.values, title)
+
+
+def region_coords(filename, latbounds=LATBOUNDS, lonbounds=LONBOUNDS):
+    """(lon, lat) coordinates of the region of interest of a file (no data read)."""
+    with open_gridsat(filename) as ds:
+        lat, lon = ds['lat'].values, ds['lon'].values
+    latslice, lonslice = region_slices(lat, lon, latbounds, lonbounds)
+    return lon[lonslice], lat[latslice]
+
+
+def render_frames(files, var='ir', latbounds=LATBOUNDS, lonbounds=LONBOUNDS, clim=None,
+                  cmap='rainbow', workers=None, ahead=None):
+    """Rendered frames of ``files`` (generator, in order), rendered in parallel."""
+    lons, lats = region_coords(files[0], latbounds, lonbounds)
+    clim = clim or CLIMS.get(var)
+    workers = workers or os.cpu_count()
+    ahead = ahead or 2*workers
+    initargs = (lons, lats, latbounds, lonbounds, clim, cmap)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=initargs) as pool:
+        # At most ``ahead`` frames in flight, so memory is bounded
+        pending = collections.deque()
+        for f in files:
+            pending.append(pool.submit(_render_file, (f, var, latbounds, lonbounds)))
+            if len(pending) >= ahead:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def render_animation(files, output, var='ir', latbounds=LATBOUNDS, lonbounds=LONBOUNDS,
+                     clim=None, cmap='rainbow', duration=200, loop=3, workers=None):
+    """Render ``files`` into the GIF (or MP4) ``output``; return the frame count."""
+    with open_writer(output, duration, loop) as writer:
+        for frame in render_frames(files, var, latbounds, lonbounds, clim, cmap, workers):
+            writer.append(frame)
+        return writer.nframes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('inputs', nargs='+', help='GRIDSAT-B1 files or glob patterns')
+    parser.add_argument('-o', '--output', required=True, help='output .gif or .mp4')
+    parser.add_argument('-v', '--var', default='ir', help="channel: 'ir', 'wv' or 'vis'")
+    parser.add_argument('--lat', type=float, nargs=2, default=LATBOUNDS)
+    parser.add_argument('--lon', type=float, nargs=2, default=LONBOUNDS)
+    parser.add_argument('--clim', type=float, nargs=2, help='colour range')
+    parser.add_argument('--cmap', default='rainbow')
+    parser.add_argument('--duration', type=float, default=200, help='ms per frame')
+    parser.add_argument('--loop', type=int, default=3)
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args(argv)
+
+    files = input_files(parser, args.inputs)
+    t0 = time.perf_counter()
+    n = render_animation(files, args.output, args.var, args.lat, args.lon, args.clim,
+                         args.cmap, args.duration, args.loop, args.workers)
+    dt = time.perf_counter() - t0
+    print('%s: %d frame(s) in %.2f s (%.1f frames/s)' % (args.output, n, dt, n/dt if dt else 0.))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
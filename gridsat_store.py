@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Ingest of GRIDSAT-B1 NetCDF archives into one time-indexed, chunked Zarr store.
+
+Example::
+
+    python gridsat_store.py 'data_GRIDSAT/GRIDSAT-B1.2013.11.*.nc' -o gridsat_201311.zarr
+    GRIDSAT_STORE=gridsat_201311.zarr python gpi.py ...
+
+A multi-day analysis over the NetCDF files pays the open and metadata parsing
+of every 3-hourly file. The store holds the channels of all the files along a
+``time`` axis (the time of the file names), in chunks of ``time`` x ``lat`` x
+``lon`` sized for regional time series (8 steps, one day, of 256 x 256 pixels
+by default), in the Zarr v2 format with consolidated metadata (one read opens
+the store; consolidated metadata is not part of the v3 specification): a time
+range and bounding box query opens one store and reads only the chunks it
+touches::
+
+    from gridsat import read_region
+    dat = read_region('gridsat_201311.zarr', 'ir', [0,30], [100,140],
+                      time=slice('2013-11-07', '2013-11-09'))
+
+Running the ingest again on a growing archive appends the new (later) files.
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import xarray as xr
+
+from file_inputs import input_files
+from gridsat import VARIABLES, file_time, region_slices
+
+CHUNKS = {'time': 8, 'lat': 256, 'lon': 256}
+
+# Encoding of the NetCDF variables kept in the store (packing and fill value)
+_KEPT_ENCODING = ('dtype', 'scale_factor', 'add_offset', '_FillValue')
+
+
+def is_store(path):
+    """True for a Zarr store directory (v2 or v3 layout)."""
+    return os.path.isdir(path) and any(os.path.exists(os.path.join(path, name))
+                                       for name in ('zarr.json', '.zgroup', '.zmetadata'))
+
+
+def open_store(path, chunks=None):
+    """Open a store lazily (dask arrays in the chunks of the store by default)."""
+    return xr.open_zarr(path, chunks=chunks if chunks is not None else {})
+
+
+def read_file(filename, variables=None, latbounds=None, lonbounds=None):
+    """Channels of a GRIDSAT-B1 file (a region of it if bounds are given), in memory,
+    with the time of its file name."""
+    with xr.open_dataset(filename, cache=False) as ds:
+        names = [VARIABLES.get(v, v) for v in variables] if variables else \
+            [v for v in VARIABLES.values() if v in ds]
+        ds = ds[names]
+        if latbounds is not None or lonbounds is not None:
+            latslice, lonslice = region_slices(ds['lat'].values, ds['lon'].values,
+                                               latbounds or [-90, 90], lonbounds or [-180, 360])
+            ds = ds.isel(lat=latslice, lon=lonslice)
+        ds = ds.load()
+    if 'time' not in ds.dims:
+        ds = ds.expand_dims('time')
+    return ds.assign_coords(time=[np.datetime64(file_time(filename), 'ns')])
+
+
+def _encoding(ds, chunks):
+    encoding = {}
+    for name, var in ds.data_vars.items():
+        enc = dict((k, v) for k, v in var.encoding.items() if k in _KEPT_ENCODING)
+        enc['chunks'] = tuple(min(chunks.get(dim, size), size) if dim != 'time' else chunks['time']
+                              for dim, size in var.sizes.items())
+        encoding[name] = enc
+    return encoding
+
+
+def ingest(files, store, variables=None, latbounds=None, lonbounds=None, chunks=None,
+           workers=4):
+    """Append ``files`` (sorted by time) to ``store``; return the number of files added.
+
+    Files whose time is already in the store are skipped. The files are read
+    a time chunk at a time (in threads) and written chunk-aligned, so every
+    write fills whole chunks.
+    """
+    chunks = dict(CHUNKS, **(chunks or {}))
+    files = sorted(files, key=file_time)
+    ntime = 0
+    if is_store(store):
+        with open_store(store) as ds:
+            times = ds['time'].values
+            variables = variables or list(ds.data_vars)
+        ntime = len(times)
+        if ntime:
+            stamp = lambda f: np.datetime64(file_time(f), 'ns')
+            missing = [f for f in files if stamp(f) <= times[-1] and stamp(f) not in set(times)]
+            if missing:
+                raise ValueError('%s: %d file(s) older than the end of the store (%s), '
+                                 'ingest them into a new store' % (store, len(missing), missing[0]))
+            files = [f for f in files if stamp(f) > times[-1]]
+    if not files:
+        return 0
+
+    nt = chunks['time']
+    # The first batch completes the last time chunk of the store
+    bounds = [0] + list(range(nt - ntime % nt, len(files), nt)) + [len(files)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for i0, i1 in zip(bounds[:-1], bounds[1:]):
+            if i0 == i1:
+                continue
+            batch = list(pool.map(lambda f: read_file(f, variables, latbounds, lonbounds),
+                                  files[i0:i1]))
+            ds = xr.concat(batch, dim='time')
+            if not is_store(store):
+                ds.attrs.update(title='GRIDSAT-B1 brightness temperatures')
+                ds.to_zarr(store, mode='w-', encoding=_encoding(ds, chunks), zarr_format=2)
+            else:
+                ds.to_zarr(store, mode='a', append_dim='time')
+    return len(files)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('inputs', nargs='+', help='GRIDSAT-B1 files or glob patterns')
+    parser.add_argument('-o', '--output', required=True, help='Zarr store (created or appended)')
+    parser.add_argument('-v', '--var', nargs='+', help="channels ('ir', 'wv', 'vis'; default: all)")
+    parser.add_argument('--lat', type=float, nargs=2, help='only ingest this latitude band')
+    parser.add_argument('--lon', type=float, nargs=2, help='only ingest this longitude band')
+    parser.add_argument('--chunks', type=int, nargs=3, metavar=('TIME', 'LAT', 'LON'),
+                        default=[CHUNKS['time'], CHUNKS['lat'], CHUNKS['lon']])
+    parser.add_argument('-j', '--workers', type=int, default=4, help='reading threads')
+    args = parser.parse_args(argv)
+
+    files = input_files(parser, args.inputs)
+    t0 = time.perf_counter()
+    n = ingest(files, args.output, args.var, args.lat, args.lon,
+               dict(zip(('time', 'lat', 'lon'), args.chunks)), args.workers)
+    with open_store(args.output) as ds:
+        print('%s: %d file(s) added in %.2f s, %d time step(s), %s'
+              % (args.output, n, time.perf_counter() - t0, ds.sizes['time'],
+                 ', '.join(ds.data_vars)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
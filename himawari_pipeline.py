@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Streaming Himawari AHI pipeline over a directory of time slots (CYCLONES.py, every slot).
+
+Example::
+
+    python himawari_pipeline.py data_HIMAWARI -p B13 water_vapors1 --bbox 80 20 140 45 -o out/
+    python himawari_pipeline.py data_HIMAWARI -p B13 -o out/ --watch --loop b13.gif
+
+The slots are the ``YYYYMMDDHHMM`` folders of HSD segment files under the root
+directory, in time order (``--watch`` keeps polling for new complete slots).
+Three stages overlap, every slot going to the next stage as soon as it leaves
+the previous one:
+
+- decode (threads, I/O bound): the Scene of only the segments intersecting
+  the box (hsd_roi.py), cropped and optionally resampled through the cached
+  nearest-neighbour tables (resample_cache.py), all still lazy
+- compose (threads, CPU bound): the dask computation of the Scene, reading
+  the pixels and building the composites, enhanced by satpy into 8-bit
+  images (numpy and dask release the GIL; Scenes are not sent to processes)
+- write (processes, CPU bound): PNG/GeoTIFF encoding of every product
+
+The frames of the first product are appended to a GIF/MP4 (``--loop``) in
+time order. Every output is written once, and never read back (CYCLONES.py
+re-reads the PNG written by ``save_dataset`` to display it). At most
+``--ahead`` slots are in flight, so memory stays bounded whatever the number
+of slots. Every slot is reported as soon as it is written, with its latency
+(from the time it was taken to the end of its writes); slots that take longer
+than the cadence (10 min full disk, 2.5 min target area) are reported.
+"""
+
+import argparse
+import glob
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from hsd_roi import select_segments
+
+CADENCE = 600.      # s, full-disk observation cycle
+
+_SLOT = re.compile(r'^(\d{12})$')
+
+
+def slot_files(path):
+    return sorted(glob.glob(os.path.join(path, '*.DAT')) + glob.glob(os.path.join(path, '*.DAT.bz2')))
+
+
+def iter_slots(root, watch=False, poll=30., settle=60.):
+    """Slot folders of ``root`` in time order; with ``watch``, wait for new ones forever.
+
+    A watched slot is taken once its files have not changed for ``settle`` seconds.
+    """
+    done = set()
+    while True:
+        pending = False
+        for name in sorted(os.listdir(root)):
+            path = os.path.join(root, name)
+            if name in done or not _SLOT.match(name) or not os.path.isdir(path):
+                continue
+            files = slot_files(path)
+            if watch and (not files or time.time() - max(os.path.getmtime(f) for f in files) < settle):
+                pending = True
+                continue
+            done.add(name)
+            yield path
+        if not watch:
+            return
+        time.sleep(poll if not pending else min(poll, settle))
+
+
+def to_image(arr):
+    """8-bit (rows, cols[, 3]) image of a satpy dataset, through its satpy enhancement."""
+    from satpy.writers import get_enhanced_image
+    data, mode = get_enhanced_image(arr).finalize(fill_value=0, dtype=np.uint8)
+    data = data.values
+    if data.shape[0] == 1:
+        return data[0]
+    return np.ascontiguousarray(np.moveaxis(data[:3], 0, -1))
+
+
+def load_slot(path, products, bbox=None, area=None, reader='ahi_hsd'):
+    """Lazy Scene of ``products`` of one slot folder (cropped to ``bbox``,
+    resampled to ``area``)."""
+    from satpy import Scene
+
+    files = slot_files(path)
+    if bbox is not None:
+        files = select_segments(files, bbox)
+    scn = Scene(filenames=files, reader=reader)
+    scn.load(products)
+    if bbox is not None:
+        # Lazy until the images are computed: only the rows of the box are decoded
+        scn = scn.crop(ll_bbox=tuple(bbox))
+    if area is not None:
+        from resample_cache import resample_scene
+        scn = resample_scene(scn, area, 'nearest', datasets=products)
+    return scn
+
+
+def compose_slot(scn, products):
+    """{product: 8-bit image} of a Scene of load_slot."""
+    return dict((p, to_image(scn[p])) for p in products)
+
+
+def decode_slot(path, products, bbox=None, area=None, reader='ahi_hsd'):
+    """(slot, {product: 8-bit image}) of one slot folder."""
+    return path, compose_slot(load_slot(path, products, bbox, area, reader), products)
+
+
+def write_slot(args):
+    """Write the images of one slot; return their file names."""
+    path, images, outdir, fmt = args
+    from raster_output import write_raster
+    stem = os.path.basename(os.path.normpath(path))
+    written = []
+    for product, img in images.items():
+        filename = os.path.join(outdir, '%s_%s.%s' % (stem, product, fmt))
+        write_raster(img, filename)
+        written.append(filename)
+    return written
+
+
+def run(slots, products, outdir, bbox=None, resample=False, resolution=0.02, fmt='png',
+        loop=None, decoders=2, composers=2, writers=None, ahead=4, cadence=CADENCE):
+    """Process ``slots`` through the decode, compose and write stages; yield
+    (slot, written files, seconds from the time the slot was taken to the end
+    of its writes) as the slots complete, with no files for a slot that failed
+    (the error is printed on stderr)."""
+    area = None
+    if resample:
+        from resample_cache import target_area
+        area = target_area(bbox, resolution)
+    os.makedirs(outdir, exist_ok=True)
+    animation = None
+    if loop:
+        from enhance_sequence import open_writer
+        animation = open_writer(loop)
+
+    # Completed slots: (index, path, taken, completed, frame, files, error),
+    # then (None, number of slots, error of the slot iterator)
+    results = queue.Queue()
+    free = threading.Semaphore(ahead)
+    stop = threading.Event()
+
+    def fail(index, path, taken, error):
+        results.put((index, path, taken, time.perf_counter(), None, [], error))
+
+    # Every stage hands its slot to the next one from the done callback of its
+    # future, so a slot never waits for older ones
+    def decoded(index, path, taken, future):
+        try:
+            cpool.submit(compose_slot, future.result(), products).add_done_callback(
+                partial(composed, index, path, taken))
+        except Exception as e:
+            fail(index, path, taken, e)
+
+    def composed(index, path, taken, future):
+        try:
+            images = future.result()
+            wpool.submit(write_slot, (path, images, outdir, fmt)).add_done_callback(
+                partial(written, index, path, taken, images[products[0]]))
+        except Exception as e:
+            fail(index, path, taken, e)
+
+    def written(index, path, taken, frame, future):
+        try:
+            files = future.result()
+        except Exception as e:
+            fail(index, path, taken, e)
+        else:
+            results.put((index, path, taken, time.perf_counter(), frame, files, None))
+
+    def feed():
+        # The slots are taken here, so that waiting for the next one (--watch)
+        # does not hold back the completed ones
+        n = 0
+        try:
+            for path in slots:
+                while not free.acquire(timeout=1.):
+                    if stop.is_set():
+                        return
+                if stop.is_set():
+                    return
+                dpool.submit(load_slot, path, products, bbox, area).add_done_callback(
+                    partial(decoded, n, path, time.perf_counter()))
+                n += 1
+        except Exception as e:
+            results.put((None, n, e))
+        else:
+            results.put((None, n, None))
+
+    frames = {}
+    nframe = 0
+    try:
+        with ThreadPoolExecutor(max_workers=decoders) as dpool, \
+                ThreadPoolExecutor(max_workers=composers) as cpool, \
+                ProcessPoolExecutor(max_workers=writers) as wpool:
+            feeder = threading.Thread(target=feed, daemon=True)
+            feeder.start()
+            try:
+                ndone, nslot = 0, None
+                while nslot is None or ndone < nslot:
+                    result = results.get()
+                    if result[0] is None:
+                        # The slots in flight still complete before an error of
+                        # the slot iterator is raised
+                        _, nslot, slots_error = result
+                        continue
+                    index, path, taken, completed, frame, files, error = result
+                    ndone += 1
+                    if error is not None:
+                        # A bad slot (truncated segment, nothing in the box...) is
+                        # reported and skipped: the slots after it, and a watch, go on
+                        print('%s: failed: %s: %s' % (path, type(error).__name__, error),
+                              file=sys.stderr)
+                    if animation is None:
+                        free.release()
+                    else:
+                        # Frames go into the loop in time order; a slot stays in
+                        # flight until its frame is in
+                        frames[index] = frame
+                        while nframe in frames:
+                            frame = frames.pop(nframe)
+                            if frame is not None:
+                                animation.append(frame)
+                            nframe += 1
+                            free.release()
+                    latency = completed - taken
+                    if latency > cadence:
+                        print('%s: %.1f s, slower than the %.0f s cadence'
+                              % (path, latency, cadence), file=sys.stderr)
+                    yield path, files, latency
+                if slots_error is not None:
+                    raise slots_error
+            finally:
+                # Before the pools shut down: the feeder takes no more slots
+                stop.set()
+    finally:
+        if animation is not None:
+            animation.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('root', help='directory of YYYYMMDDHHMM slot folders of HSD files')
+    parser.add_argument('-p', '--products', nargs='+', default=['B13'],
+                        help='bands and satpy composites (first one goes to --loop)')
+    parser.add_argument('-o', '--outdir', required=True)
+    parser.add_argument('--bbox', type=float, nargs=4,
+                        metavar=('LON_MIN', 'LAT_MIN', 'LON_MAX', 'LAT_MAX'))
+    parser.add_argument('--resample', action='store_true',
+                        help='resample the box to a lat/lon grid (needs --bbox)')
+    parser.add_argument('--resolution', type=float, default=0.02, help='deg, with --resample')
+    parser.add_argument('-f', '--format', choices=['png', 'tif'], default='png')
+    parser.add_argument('--loop', help='also stream the first product into this .gif/.mp4')
+    parser.add_argument('--watch', action='store_true', help='wait for new slots')
+    parser.add_argument('--cadence', type=float, default=CADENCE, help='s between slots')
+    parser.add_argument('--decoders', type=int, default=2, help='slots decoded concurrently')
+    parser.add_argument('--composers', type=int, default=2, help='slots composed concurrently')
+    parser.add_argument('-j', '--writers', type=int, default=os.cpu_count())
+    parser.add_argument('--ahead', type=int, default=4, help='slots in flight')
+    args = parser.parse_args(argv)
+    if args.resample and not args.bbox:
+        parser.error('--resample needs --bbox')
+
+    t0 = time.perf_counter()
+    n = failed = 0
+    for path, files, latency in run(iter_slots(args.root, args.watch), args.products,
+                                    args.outdir, args.bbox, args.resample, args.resolution,
+                                    args.format, args.loop, args.decoders, args.composers,
+                                    args.writers, args.ahead, args.cadence):
+        n += 1
+        failed += not files
+        print('%s: %d file(s) in %.1f s' % (os.path.basename(path), len(files), latency))
+    dt = time.perf_counter() - t0
+    print('%d slot(s) in %.1f s (%.1f s/slot), %d failed' % (n, dt, dt/n if n else 0., failed))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Histogram-based enhancement schemes: equalization (HE) and CLAHE.
+
+Unlike the fixed curves, these schemes depend on the image: a first pass
+accumulates 256-bin histograms (one for HE, one per grid tile for CLAHE) and a
+second pass maps the pixels through the lookup tables derived from them. Both
+passes work on windows (``update``/``transform`` with the window position), so
+the schemes run on whole images as well as through the tiled path of
+enhance_tiled.py.
+
+- CLAHE: Zuiderveld, Contrast Limited Adaptive Histogram Equalization,
+  Graphics Gems IV, 1994.
+"""
+
+import abc
+
+import numpy as np
+
+from enhancement import apply_lut
+
+
+def equalization_lut(hist):
+    """256-entry table equalizing the histogram ``hist``."""
+    cdf = np.cumsum(hist, dtype='float64')
+    total = cdf[-1]
+    cdf_min = cdf[np.nonzero(hist)[0][0]] if total else 0.
+    if total == cdf_min:
+        return np.arange(256, dtype='uint8')
+    lut = (cdf - cdf_min)/(total - cdf_min)*255
+    return np.clip(np.rint(lut), 0, 255).astype('uint8')
+
+
+class AdaptiveScheme(abc.ABC):
+    """Scheme whose tables are computed from the image itself."""
+
+    name = None
+
+    @abc.abstractmethod
+    def model(self, shape):
+        """Empty model of an image of ``shape`` (rows, cols)."""
+
+    def apply(self, img):
+        img = np.asarray(img)
+        if img.dtype != np.uint8:
+            raise TypeError('expected an uint8 image, got %s' % img.dtype)
+        window = (slice(0, img.shape[0]), slice(0, img.shape[1]))
+        m = self.model(img.shape)
+        m.update(img, *window)
+        m.finalize()
+        return m.transform(img, *window)
+
+
+class _HEModel(object):
+
+    def __init__(self):
+        self.hist = np.zeros(256, 'int64')
+        self.lut = None
+
+    def update(self, tile, rows, cols):
+        self.hist += np.bincount(tile.ravel(), minlength=256)
+
+    def finalize(self):
+        self.lut = equalization_lut(self.hist)
+
+    def transform(self, tile, rows, cols):
+        return apply_lut(tile, self.lut)
+
+
+class HistogramEqualization(AdaptiveScheme):
+    """Global histogram equalization."""
+
+    name = 'HE'
+
+    def model(self, shape):
+        return _HEModel()
+
+
+class _CLAHEModel(object):
+
+    def __init__(self, shape, grid, clip_limit):
+        self.shape = shape[:2]
+        self.gy = min(grid[0], shape[0])
+        self.gx = min(grid[1], shape[1])
+        # Tile size (the last row/column of tiles may be smaller), then the
+        # number of tiles that are not empty: 10 rows in 8 tiles of 2 rows fill 5
+        self.th = -(-shape[0]//self.gy)
+        self.tw = -(-shape[1]//self.gx)
+        self.gy = -(-shape[0]//self.th)
+        self.gx = -(-shape[1]//self.tw)
+        self.clip_limit = clip_limit
+        self.hist = np.zeros(self.gy*self.gx*256, 'int64')
+        self.luts = None
+
+    def update(self, tile, rows, cols):
+        ty = np.arange(rows.start, rows.stop)//self.th
+        tx = np.arange(cols.start, cols.stop)//self.tw
+        base = (ty[:,None]*self.gx + tx[None,:])*256
+        self.hist += np.bincount((base + tile).ravel(), minlength=self.hist.size)
+
+    def finalize(self):
+        hist = self.hist.reshape(self.gy*self.gx, 256).astype('float64')
+        npix = hist.sum(axis=1, keepdims=True)
+        if self.clip_limit:
+            # Clip every histogram and redistribute the excess uniformly
+            limit = np.maximum(self.clip_limit*npix/256., 1.)
+            excess = np.maximum(hist - limit, 0).sum(axis=1, keepdims=True)
+            hist = np.minimum(hist, limit) + excess/256.
+        cdf = np.cumsum(hist, axis=1)
+        self.luts = (cdf*255./np.maximum(npix, 1)).ravel()
+
+    def _weights(self, start, stop, size, n):
+        # Lower tile index and weight of the upper tile, between tile centres
+        f = (np.arange(start, stop) + 0.5)/size - 0.5
+        i0 = np.clip(np.floor(f).astype('intp'), 0, n-1)
+        i1 = np.minimum(i0+1, n-1)
+        w = np.clip(f - i0, 0., 1.)
+        w[i1 == i0] = 0.
+        return i0, i1, w
+
+    def transform(self, tile, rows, cols):
+        y0, y1, wy = self._weights(rows.start, rows.stop, self.th, self.gy)
+        x0, x1, wx = self._weights(cols.start, cols.stop, self.tw, self.gx)
+        v = tile.astype('intp')
+        wx = wx[None,:]
+
+        def lookup(ty, tx):
+            return np.take(self.luts, ((ty[:,None]*self.gx + tx[None,:])*256) + v)
+
+        top = lookup(y0, x0)*(1-wx) + lookup(y0, x1)*wx
+        bottom = lookup(y1, x0)*(1-wx) + lookup(y1, x1)*wx
+        out = top*(1-wy[:,None]) + bottom*wy[:,None]
+        return np.clip(np.rint(out), 0, 255).astype('uint8')
+
+
+class CLAHE(AdaptiveScheme):
+    """Contrast-limited adaptive histogram equalization.
+
+    The image is divided into a ``grid`` of tiles; the histogram of each tile is
+    clipped at ``clip_limit`` times its mean bin count and equalized, and every
+    pixel is bilinearly interpolated between the tables of the four nearest
+    tile centres. On images smaller than the grid, only the tiles that hold
+    pixels are used::
+
+        >>> np.unique(CLAHE().apply(np.full((10, 10), 128, 'uint8')))
+        array([160], dtype=uint8)
+    """
+
+    name = 'CLAHE'
+
+    def __init__(self, grid=(8, 8), clip_limit=2.0):
+        self.grid = tuple(grid)
+        self.clip_limit = clip_limit
+
+    def model(self, shape):
+        return _CLAHEModel(shape, self.grid, self.clip_limit)
+
+
+# Adaptive schemes available by name next to the curves of scheme_registry.py
+ADAPTIVE_SCHEMES = {
+    'HE': HistogramEqualization,
+    'CLAHE': CLAHE,
+}
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Region-of-interest pushdown for Himawari AHI HSD files (satpy ``ahi_hsd`` reader).
+
+Example::
+
+    python hsd_roi.py 'data_HIMAWARI/202312170010/*.DAT' --bbox 80 20 140 45
+
+A full-disk HSD band is split into 10 segment files from north to south
+(``HS_H09_20231217_0010_B01_FLDK_R10_S0110.DAT`` is segment 1 of 10). The
+scan lines of the bounding box are computed with the normalized geostationary
+projection of the CGMS (sub-satellite longitude 140.7E) at the resolution of
+every file, so only the segments that intersect the box are given to satpy;
+the scene is then cropped to the box before anything is computed, and only the
+rows of the box are decoded::
+
+    scn = load_roi(files, (80, 20, 140, 45), ['B13'])
+"""
+
+import argparse
+import os
+import re
+import sys
+
+import numpy as np
+
+from file_inputs import input_files
+
+SUB_LON = 140.7         # deg E, Himawari-8/9
+NSEGMENTS = 10
+EARTH_EQUATORIAL = 6378.1370    # km
+EARTH_POLAR = 6356.7523
+SATELLITE_DISTANCE = 42164.     # km from the Earth centre
+
+# Column/line scaling factors and offsets of the full disk per resolution (HSD headers)
+GRIDS = {
+    'R05': (81865099, 11000.5, 22000),    # 0.5 km: LFAC, LOFF, lines
+    'R10': (40932549, 5500.5, 11000),     # 1 km
+    'R20': (20466275, 2750.5, 5500),      # 2 km
+}
+
+_SEGMENT = re.compile(r'_(R\d{2})_S(\d{2})(\d{2})\.DAT', re.IGNORECASE)
+
+
+def segment_info(filename):
+    """(resolution, segment, number of segments) of an HSD file name."""
+    m = _SEGMENT.search(os.path.basename(filename))
+    if m is None:
+        raise ValueError('%s: not an HSD segment file name (..._R10_S0110.DAT)' % filename)
+    return m.group(1).upper(), int(m.group(2)), int(m.group(3))
+
+
+def geos_lines(lat, lon, resolution='R20', sub_lon=SUB_LON):
+    """Full-disk scan line (1-based, from the north) of points; NaN when not visible."""
+    lfac, loff, _ = GRIDS[resolution]
+    lat, lon = np.radians(np.asarray(lat, 'float64')), np.asarray(lon, 'float64')
+    ratio = (EARTH_POLAR/EARTH_EQUATORIAL)**2
+    c_lat = np.arctan(ratio*np.tan(lat))
+    rl = EARTH_POLAR/np.sqrt(1 - (1 - ratio)*np.cos(c_lat)**2)
+    dlon = np.radians(lon - sub_lon)
+    r1 = SATELLITE_DISTANCE - rl*np.cos(c_lat)*np.cos(dlon)
+    r2 = -rl*np.cos(c_lat)*np.sin(dlon)
+    r3 = rl*np.sin(c_lat)
+    rn = np.sqrt(r1**2 + r2**2 + r3**2)
+    y = np.degrees(np.arcsin(-r3/rn))
+    lines = loff + y*lfac/2.**16
+    # Points behind the limb face away from the satellite
+    visible = SATELLITE_DISTANCE*(SATELLITE_DISTANCE - r1) - rl**2 > 0
+    return np.where(visible, lines, np.nan)
+
+
+def bbox_lines(bbox, resolution='R20', sub_lon=SUB_LON, samples=64, margin=2):
+    """(first, last) full-disk scan lines covering ``bbox`` (lon_min, lat_min, lon_max, lat_max)."""
+    lon_min, lat_min, lon_max, lat_max = bbox
+    lon, lat = np.meshgrid(np.linspace(lon_min, lon_max, samples),
+                           np.linspace(lat_min, lat_max, samples))
+    lines = geos_lines(lat, lon, resolution, sub_lon)
+    nlines = GRIDS[resolution][2]
+    if np.isnan(lines).all():
+        raise ValueError('bounding box %s not seen from %.1fE' % (tuple(bbox), sub_lon))
+    first = max(1, int(np.floor(np.nanmin(lines))) - margin)
+    last = min(nlines, int(np.ceil(np.nanmax(lines))) + margin)
+    return first, last
+
+
+def bbox_segments(bbox, resolution='R20', sub_lon=SUB_LON, nsegments=NSEGMENTS):
+    """Segment numbers (1-based) of a full disk at ``resolution`` that intersect ``bbox``."""
+    first, last = bbox_lines(bbox, resolution, sub_lon)
+    seglines = GRIDS[resolution][2]//nsegments
+    return list(range((first - 1)//seglines + 1, (last - 1)//seglines + 2))
+
+
+def select_segments(files, bbox, sub_lon=SUB_LON):
+    """The HSD segment files of ``files`` that intersect ``bbox``."""
+    keep = {}
+    selected = []
+    for f in files:
+        resolution, segment, nsegments = segment_info(f)
+        if (resolution, nsegments) not in keep:
+            keep[resolution, nsegments] = set(bbox_segments(bbox, resolution, sub_lon, nsegments))
+        if segment in keep[resolution, nsegments]:
+            selected.append(f)
+    return selected
+
+
+def load_roi(files, bbox, datasets, reader='ahi_hsd', sub_lon=SUB_LON, **scene_kw):
+    """Scene of the segments intersecting ``bbox``, loaded and cropped to it (still lazy).
+
+    ``scene_kw`` go to satpy's Scene (``filter_parameters``...).
+    """
+    from satpy import Scene
+
+    selected = select_segments(files, bbox, sub_lon)
+    if not selected:
+        raise ValueError('no HSD segment intersects %s' % (tuple(bbox),))
+    scn = Scene(filenames=selected, reader=reader, **scene_kw)
+    scn.load(datasets)
+    # Cropping the dask arrays before computing them: only the rows of the box are read
+    return scn.crop(ll_bbox=tuple(bbox))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('inputs', nargs='+', help='HSD files or glob patterns')
+    parser.add_argument('--bbox', type=float, nargs=4, required=True,
+                        metavar=('LON_MIN', 'LAT_MIN', 'LON_MAX', 'LAT_MAX'))
+    parser.add_argument('--sub-lon', type=float, default=SUB_LON)
+    args = parser.parse_args(argv)
+
+    files = input_files(parser, args.inputs)
+    selected = select_segments(files, args.bbox, args.sub_lon)
+    for resolution in sorted(set(segment_info(f)[0] for f in files)):
+        first, last = bbox_lines(args.bbox, resolution, args.sub_lon)
+        print('%s: lines %d-%d of %d, segments %s'
+              % (resolution, first, last, GRIDS[resolution][2],
+                 ' '.join(map(str, bbox_segments(args.bbox, resolution, args.sub_lon)))))
+    print('%d of %d file(s) selected' % (len(selected), len(files)))
+    for f in selected:
+        print(f)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Direct colormap-to-raster output of map products, without matplotlib figures.
+
+Example::
+
+    python raster_output.py 'data_GRIDSAT/GRIDSAT-B1.2013.11.07.*.nc' -v ir -o ir_loop.gif
+    python raster_output.py 'data_GRIDSAT/GRIDSAT-B1.2013.11.07.*.nc' --gpi -o gpi_maps/ -f tif
+
+Operational frames do not need axes and colorbars. The values of the region
+are mapped through a colormap compiled into a lookup table (one gather per
+pixel), resampled into the target projection through an index map computed
+once per grid and cached (geometry_cache.py), and written as PNG or tiled
+GeoTIFF files, or streamed into a GIF/MP4 loop. This is orders of magnitude
+faster than ``m.pcolormesh(..., cmap='rainbow')`` on large grids.
+
+The target projections are ``merc`` (spherical Mercator, EPSG:3857 in the
+GeoTIFFs) and ``latlon`` (plate carree, EPSG:4326), north up.
+"""
+
+import argparse
+import collections
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from file_inputs import input_files
+from geometry_cache import cached, grid_digest
+from gridsat import CLIMS, LATBOUNDS, LONBOUNDS, read_region
+
+EARTH_RADIUS = 6378137.     # m, spherical Mercator (EPSG:3857)
+CRS = {'merc': 'EPSG:3857', 'latlon': 'EPSG:4326'}
+
+
+def _rainbow(x):
+    # matplotlib 'rainbow' (gnuplot functions 33, 13, 10)
+    return np.stack([np.abs(2*x - 0.5), np.sin(np.pi*x), np.cos(np.pi*x/2)], axis=-1)
+
+
+COLORMAPS = {
+    'rainbow': _rainbow,
+    'gray': lambda x: np.stack([x, x, x], axis=-1),
+    'gray_r': lambda x: np.stack([1-x, 1-x, 1-x], axis=-1),
+}
+
+
+def colormap_table(cmap='rainbow', n=256):
+    """(n, 3) uint8 colours of a colormap (built in, or any matplotlib colormap name)."""
+    x = np.linspace(0., 1., n)
+    if cmap in COLORMAPS:
+        rgb = COLORMAPS[cmap](x)
+    else:
+        import matplotlib
+        rgb = matplotlib.colormaps[cmap](x)[:, :3]
+    return np.round(np.clip(rgb, 0., 1.)*255).astype('uint8')
+
+
+class ColormapLUT(object):
+    """Values in [vmin, vmax] to RGB through a compiled colormap; NaN to ``bad``."""
+
+    def __init__(self, cmap='rainbow', vmin=0., vmax=1., n=256, bad=(0, 0, 0)):
+        self.vmin, self.vmax, self.n = float(vmin), float(vmax), n
+        # The last entry is the colour of the missing values
+        self.table = np.vstack([colormap_table(cmap, n), np.asarray(bad, 'uint8')[None]])
+
+    def index(self, data):
+        """Table index of every value (n for NaN)."""
+        data = np.asarray(data)
+        x = data.astype('float32')
+        x -= self.vmin
+        x *= self.n/(self.vmax - self.vmin)
+        np.clip(x, 0, self.n-1, out=x)
+        with np.errstate(invalid='ignore'):
+            idx = x.astype('int16')
+        if data.dtype.kind == 'f':
+            idx[np.isnan(data)] = self.n
+        return idx
+
+    def __call__(self, data):
+        return np.take(self.table, self.index(data), axis=0)
+
+
+def _nearest(coord, values):
+    """Index of the nearest ``coord`` (1-D, ascending or not) of every value."""
+    coord = np.asarray(coord, 'float64')
+    order = np.argsort(coord)
+    c = coord[order]
+    i = np.clip(np.searchsorted(c, values), 1, len(c)-1)
+    i -= (values - c[i-1]) < (c[i] - values)
+    return order[i]
+
+
+def _mercator_y(lat):
+    return EARTH_RADIUS*np.log(np.tan(np.pi/4 + np.radians(lat)/2))
+
+
+def target_grid(latbounds, lonbounds, width, projection='merc', height=None):
+    """Centre lat/lon of the rows (north first) and columns of the target raster, and its bounds.
+
+    The bounds (west, south, east, north) are in the units of the projection;
+    ``height`` defaults to the square-pixel height.
+    """
+    latmin, latmax = float(min(latbounds)), float(max(latbounds))
+    lonmin, lonmax = float(min(lonbounds)), float(max(lonbounds))
+    if projection == 'merc':
+        west, east = EARTH_RADIUS*np.radians(lonmin), EARTH_RADIUS*np.radians(lonmax)
+        south, north = _mercator_y(latmin), _mercator_y(latmax)
+    elif projection == 'latlon':
+        west, east, south, north = lonmin, lonmax, latmin, latmax
+    else:
+        raise ValueError("unknown projection %r ('merc' or 'latlon')" % projection)
+    height = height or max(1, int(round(width*(north - south)/(east - west))))
+
+    x = lonmin + (lonmax - lonmin)*(np.arange(width) + 0.5)/width
+    y = north - (north - south)*(np.arange(height) + 0.5)/height
+    if projection == 'merc':
+        y = np.degrees(2*np.arctan(np.exp(y/EARTH_RADIUS)) - np.pi/2)
+    return y, x, (west, south, east, north)
+
+
+def resample_index(lats, lons, latbounds, lonbounds, width=None, projection='merc'):
+    """Cached (rows, cols) nearest-neighbour index map of a lat/lon grid into the target.
+
+    Both projections keep meridians and parallels straight, so the map is
+    separable: the raster is ``data[np.ix_(rows, cols)]``. ``width`` defaults to
+    the number of grid columns in the region (native resolution).
+    """
+    lats, lons = np.asarray(lats, 'float64'), np.asarray(lons, 'float64')
+    width = width or int(np.count_nonzero((lons >= min(lonbounds)) & (lons <= max(lonbounds))))
+
+    def build():
+        tlat, tlon, bounds = target_grid(latbounds, lonbounds, width, projection)
+        return _nearest(lats, tlat), _nearest(lons, tlon), bounds
+
+    return cached('resample', (projection, tuple(map(float, latbounds)),
+                               tuple(map(float, lonbounds)), width, grid_digest(lons, lats)), build)
+
+
+def render(data, lats, lons, colormap, latbounds=LATBOUNDS, lonbounds=LONBOUNDS,
+           width=None, projection='merc'):
+    """RGB raster (rows, cols, 3) of a (lat, lon) field; returns (rgb, bounds)."""
+    rows, cols, bounds = resample_index(lats, lons, latbounds, lonbounds, width, projection)
+    # Resample the table indices (int16) rather than the colours
+    idx = colormap.index(np.squeeze(data))[np.ix_(rows, cols)]
+    return np.take(colormap.table, idx, axis=0), bounds
+
+
+def write_raster(rgb, filename, bounds=None, projection='merc'):
+    """Write an RGB raster as PNG, or as a tiled GeoTIFF georeferenced by ``bounds``."""
+    ext = os.path.splitext(filename)[1].lower()
+    if ext in ('.tif', '.tiff'):
+        from enhance_tiled import TiffWriter
+        profile = {}
+        if bounds is not None:
+            from rasterio.transform import from_bounds
+            profile = {'crs': CRS[projection],
+                       'transform': from_bounds(*bounds, rgb.shape[1], rgb.shape[0])}
+        writer = TiffWriter(filename, rgb.shape, profile)
+        try:
+            writer.write(slice(0, rgb.shape[0]), slice(0, rgb.shape[1]), rgb)
+        finally:
+            writer.close()
+    else:
+        from PIL import Image
+        Image.fromarray(rgb).save(filename, compress_level=1)
+
+
+def product_field(filename, product='ir', latbounds=LATBOUNDS, lonbounds=LONBOUNDS, box_km=50.):
+    """(data, lats, lons) of a GRIDSAT-B1 file: a channel, or the GPI rainfall of the file."""
+    if product == 'gpi':
+        from gpi import file_rain
+        rain = file_rain(filename, latbounds, lonbounds, box_km)
+        return rain.values, rain.lat.values, rain.lon.values
+    dat = read_region(filename, product, latbounds, lonbounds)
+    return np.squeeze(dat.values), dat.lat.values, dat.lon.values
+
+
+def _render_file(args):
+    filename, product, latbounds, lonbounds, box_km, cmap, clim, width, projection = args
+    data, lats, lons = product_field(filename, product, latbounds, lonbounds, box_km)
+    return render(data, lats, lons, ColormapLUT(cmap, *clim), latbounds, lonbounds,
+                  width, projection)
+
+
+def _rendered(pool, tasks, ahead):
+    # At most ``ahead`` frames in flight (rendering or waiting to be written), in order
+    pending = collections.deque()
+    for task in tasks:
+        pending.append(pool.submit(_render_file, task))
+        if len(pending) >= ahead:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def render_files(files, output, product='ir', latbounds=LATBOUNDS, lonbounds=LONBOUNDS,
+                 cmap='rainbow', clim=None, width=None, projection='merc', fmt='png',
+                 box_km=50., duration=200, loop=0, workers=None, ahead=None):
+    """Render ``files`` into one image per file in the directory ``output``, or into
+    the animation ``output`` (.gif, .mp4); return the number of frames."""
+    clim = clim or CLIMS[product]
+    tasks = ((f, product, latbounds, lonbounds, box_km, cmap, clim, width, projection)
+             for f in files)
+    animation = os.path.splitext(output)[1].lower() in ('.gif', '.mp4')
+    workers = workers or os.cpu_count()
+    n = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        frames = _rendered(pool, tasks, ahead or 2*workers)
+        if animation:
+            from enhance_sequence import open_writer
+            with open_writer(output, duration, loop) as writer:
+                for rgb, _ in frames:
+                    writer.append(rgb)
+                return writer.nframes
+        os.makedirs(output, exist_ok=True)
+        for f, (rgb, bounds) in zip(files, frames):
+            name = os.path.splitext(os.path.basename(f))[0]
+            write_raster(rgb, os.path.join(output, '%s_%s.%s' % (name, product, fmt)),
+                         bounds, projection)
+            n += 1
+    return n
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('inputs', nargs='+', help='GRIDSAT-B1 files or glob patterns')
+    parser.add_argument('-o', '--output', required=True,
+                        help='output directory, or .gif/.mp4 animation')
+    parser.add_argument('-v', '--var', default='ir', help="channel: 'ir', 'wv' or 'vis'")
+    parser.add_argument('--gpi', action='store_true', help='render the GPI rainfall of the files')
+    parser.add_argument('--box-km', type=float, default=50.)
+    parser.add_argument('--lat', type=float, nargs=2, default=LATBOUNDS)
+    parser.add_argument('--lon', type=float, nargs=2, default=LONBOUNDS)
+    parser.add_argument('--projection', choices=sorted(CRS), default='merc')
+    parser.add_argument('--width', type=int, help='raster width (default: native resolution)')
+    parser.add_argument('--cmap', default='rainbow')
+    parser.add_argument('--clim', type=float, nargs=2, help='colour range')
+    parser.add_argument('-f', '--format', choices=['png', 'tif'], default='png')
+    parser.add_argument('--duration', type=float, default=200, help='ms per frame')
+    parser.add_argument('--loop', type=int, default=0, help='GIF loops (0: forever)')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args(argv)
+
+    files = input_files(parser, args.inputs)
+    t0 = time.perf_counter()
+    n = render_files(files, args.output, 'gpi' if args.gpi else args.var, args.lat, args.lon,
+                     args.cmap, args.clim, args.width, args.projection, args.format,
+                     args.box_km, args.duration, args.loop, args.workers)
+    dt = time.perf_counter() - t0
+    print('%s: %d frame(s) in %.2f s (%.1f frames/s)' % (args.output, n, dt, n/dt if dt else 0.))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Resampling lookup tables computed once per (source area, target area, resampler).
+
+The target area of the Himawari products never changes from one 10-minute
+slot to the next, and neither does the (cropped) source area, so the
+neighbour search of a nearest-neighbour resampling is done once: the flat
+source index of every target pixel is kept in memory and pickled on disk
+(geometry_cache.py, ``GEOMETRY_CACHE_DIR``) under the hash of both area
+definitions. Resampling a band or a composite of a new scene is then a single
+gather::
+
+    area = target_area((80, 20, 140, 45))
+    out = resample_scene(roi, area, 'nearest')      # roi: cropped satpy Scene
+
+Bilinear resampling goes through satpy with its own on-disk cache of the
+resampling coefficients (``cache_dir``); ``native`` needs no lookup table.
+"""
+
+import hashlib
+import os
+
+import numpy as np
+import xarray as xr
+
+from geometry_cache import CACHE_DIR, cached
+
+RADIUS = 5000.      # m, radius of influence (AHI IR pixels are 2 km at nadir)
+
+# Resamplers of satpy that keep their coefficients in cache_dir
+SATPY_CACHED = ('bilinear',)
+
+
+def area_key(area):
+    """Hashable description of a pyresample area (projection, extent, shape)."""
+    if hasattr(area, 'area_extent'):
+        return (area.crs.to_wkt(), tuple(float(v) for v in area.area_extent), tuple(area.shape))
+    # Swath: hash of the coordinates
+    lons, lats = (np.ascontiguousarray(np.asarray(c), 'float64') for c in area.get_lonlats())
+    return ('swath', hashlib.sha256(lons.tobytes() + b'|' + lats.tobytes()).hexdigest()[:16])
+
+
+def target_area(bbox, resolution=0.02, name='roi', projection='EPSG:4326'):
+    """Area definition of a lon/lat bounding box (lon_min, lat_min, lon_max, lat_max)."""
+    from pyresample import create_area_def
+    return create_area_def(name, projection, area_extent=tuple(bbox), resolution=resolution,
+                           units='degrees')
+
+
+class NearestIndex(object):
+    """Flat source index of every target pixel (-1 where no source pixel is in range)."""
+
+    def __init__(self, index, shape):
+        self.index = index
+        self.shape = tuple(shape)
+        self.valid = index >= 0
+
+    @classmethod
+    def build(cls, source, target, radius=RADIUS):
+        from pyresample.kd_tree import get_neighbour_info
+        valid_in, valid_out, idx, _ = get_neighbour_info(source, target, radius, neighbours=1)
+        src = np.flatnonzero(valid_in)
+        # Neighbours out of range are flagged with the number of valid input pixels
+        found = idx < len(src)
+        index = np.full(int(np.prod(target.shape)), -1,
+                        'int32' if src.size and src[-1] < 2**31 else 'int64')
+        index[np.flatnonzero(valid_out)[found]] = src[idx[found]]
+        return cls(index, target.shape)
+
+    def __call__(self, data, fill_value=None):
+        """Resample an array whose last two axes are the source (y, x) grid."""
+        data = np.asarray(data)
+        flat = data.reshape(data.shape[:-2] + (-1,))
+        out = np.take(flat, np.where(self.valid, self.index, 0), axis=-1)
+        if fill_value is None:
+            fill_value = np.nan if data.dtype.kind == 'f' else 0
+        out[..., ~self.valid] = fill_value
+        return out.reshape(data.shape[:-2] + self.shape)
+
+
+def resample_index(source, target, resampler='nearest', radius=RADIUS, cache_dir=CACHE_DIR):
+    """Lookup table from ``source`` to ``target``, cached in memory and on disk."""
+    if resampler != 'nearest':
+        raise ValueError('no lookup table for the %r resampler' % resampler)
+    return cached('resample-%s' % resampler, (area_key(source), area_key(target), float(radius)),
+                  lambda: NearestIndex.build(source, target, radius), cache_dir)
+
+
+def resample_array(arr, target, resampler='nearest', radius=RADIUS, cache_dir=CACHE_DIR):
+    """Resampled copy of a satpy DataArray (attrs['area']), through the cached table."""
+    index = resample_index(arr.attrs['area'], target, resampler, radius, cache_dir)
+    dims = arr.dims[:-2] + ('y', 'x')
+    coords = dict((d, arr.coords[d]) for d in arr.dims[:-2] if d in arr.coords)
+    return xr.DataArray(index(arr.values), dims=dims, coords=coords, name=arr.name,
+                        attrs=dict(arr.attrs, area=target))
+
+
+def resample_scene(scn, target, resampler='nearest', datasets=None, radius=RADIUS,
+                   cache_dir=CACHE_DIR, **kwargs):
+    """Scene resampled to ``target``: cached lookup tables for 'nearest', satpy otherwise."""
+    if resampler != 'nearest':
+        if resampler in SATPY_CACHED:
+            kwargs.setdefault('cache_dir', os.path.join(cache_dir, 'satpy'))
+        return scn.resample(target, resampler=resampler, datasets=datasets, **kwargs)
+
+    from satpy import Scene
+    out = Scene()
+    for name in datasets or scn.keys():
+        out[name] = resample_array(scn[name], target, resampler, radius, cache_dir)
+    return out
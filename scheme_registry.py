@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Registry of the NOAA-style enhancement curves described in scheme files.
+
+- Enhancement scheme: https://www.ospo.noaa.gov/Organization/FAQ/enhancements.html
+
+A scheme file is looked up by name (``ZA``, ``MB``, ``BD``, ``CA``, ``JG``,
+``NHC``...) in the scheme directories: ``data/schemes`` of this repository, the
+directories of the ``ENHANCEMENT_SCHEME_PATH`` environment variable and any
+directory added with ``SchemeRegistry.add_path``. Supported files:
+
+- ``NAME.txt`` / ``NAME.csv`` with 2 columns: grey curve given by breakpoints
+  (input count, output count), e.g. ``data/schemes/ZA.txt``
+- ``NAME.txt`` / ``NAME.csv`` with 8 columns: three-channel curve given by
+  segments ``x1 x2 yb1 yb2 yg1 yg2 yr1 yr2`` (``BD.csv``, ``BD.txt``)
+- ``NAME.json``: ``{"x": [...], "y": [...]}`` for a grey curve or
+  ``{"segments": [[x1, x2, yb1, yb2, yg1, yg2, yr1, yr2], ...]}``
+
+Each curve is validated and compiled once into its lookup table. Compiled
+tables are cached in memory and on disk (``ENHANCEMENT_CACHE_DIR``, by default
+``~/.cache/remote-sensing-atmosphere/schemes``) under the hash of the file, so
+later runs load a ready table instead of parsing and compiling again.
+"""
+
+import hashlib
+import json
+import os
+import warnings
+
+import numpy as np
+
+from enhancement import (BD_COLUMNS, SCHEMES, ColourScheme, get_lut,
+                         lut_piecewise, read_table)
+from histogram_enhancement import ADAPTIVE_SCHEMES
+
+SCHEME_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'schemes')
+CACHE_DIR = os.environ.get('ENHANCEMENT_CACHE_DIR',
+                           os.path.join(os.path.expanduser('~'), '.cache',
+                                        'remote-sensing-atmosphere', 'schemes'))
+EXTENSIONS = ('.json', '.csv', '.txt')
+
+# Bumped whenever the compiled table layout changes
+_CACHE_VERSION = b'1'
+
+
+def read_scheme(filename):
+    """Read and validate a scheme file.
+
+    Returns ``('grey', (x, y))`` or ``('colour', table)`` with ``table`` of shape
+    (nsegments, 8) ordered as BD_COLUMNS.
+    """
+    if filename.endswith('.json'):
+        with open(filename, 'r') as f:
+            spec = json.load(f)
+        if 'segments' in spec:
+            kind, data = 'colour', np.array(spec['segments'], 'int64')
+        else:
+            kind, data = 'grey', np.array([spec['x'], spec['y']], 'int64').T
+        header = spec.get('columns')
+    else:
+        header, data = read_table(filename)
+        kind = 'grey' if data.shape[1] == 2 else 'colour'
+
+    if data.ndim != 2 or data.size == 0:
+        raise ValueError('%s: empty or malformed scheme' % filename)
+    if data.min() < 0 or data.max() > 255:
+        raise ValueError('%s: counts must be in 0..255' % filename)
+
+    if kind == 'grey':
+        if data.shape[1] != 2 or len(data) < 2:
+            raise ValueError('%s: a grey scheme needs at least 2 (x, y) breakpoints' % filename)
+        x, y = data[:,0], data[:,1]
+        if np.any(np.diff(x) < 0):
+            raise ValueError('%s: breakpoints must be sorted by input count' % filename)
+        return kind, (x, y)
+
+    if data.shape[1] != len(BD_COLUMNS):
+        raise ValueError('%s: a colour scheme needs the %d columns %s'
+                         % (filename, len(BD_COLUMNS), BD_COLUMNS))
+    if header is not None:
+        try:
+            data = data[:, [header.index(c) for c in BD_COLUMNS]]
+        except ValueError:
+            raise ValueError('%s: expected the columns %s' % (filename, BD_COLUMNS))
+    if np.any(data[:,1] <= data[:,0]):
+        raise ValueError('%s: every segment needs x1 < x2' % filename)
+    return kind, data
+
+
+class SchemeRegistry(object):
+    """Enhancement schemes by name, compiled once and cached on disk.
+
+    ``get(name)`` returns a 256-entry uint8 table for a grey scheme, an
+    enhancement.ColourScheme for a three-channel scheme and a
+    histogram_enhancement.AdaptiveScheme for the histogram-based ones (HE, CLAHE).
+    """
+
+    def __init__(self, paths=None, cache_dir=CACHE_DIR):
+        if paths is None:
+            paths = [SCHEME_DIR] + [p for p in
+                                    os.environ.get('ENHANCEMENT_SCHEME_PATH', '').split(os.pathsep) if p]
+        self.paths = list(paths)
+        self.cache_dir = cache_dir
+        self._files = {}
+        self._compiled = {}
+
+    def add_path(self, path):
+        """Add a scheme directory (searched first) or register a single scheme file."""
+        if os.path.isdir(path):
+            self.paths.insert(0, path)
+        else:
+            self.register(path)
+
+    def register(self, filename, name=None):
+        if name is None:
+            name = os.path.splitext(os.path.basename(filename))[0]
+        self._files[name] = filename
+        self._compiled.pop(name, None)
+
+    def find(self, name):
+        """Path of the scheme file ``name`` (None for a built-in or unknown scheme)."""
+        if name in self._files:
+            return self._files[name]
+        for path in self.paths:
+            for ext in EXTENSIONS:
+                filename = os.path.join(path, name + ext)
+                if os.path.isfile(filename):
+                    return filename
+        return None
+
+    def names(self):
+        names = set(SCHEMES) | set(ADAPTIVE_SCHEMES) | set(self._files)
+        for path in self.paths:
+            if os.path.isdir(path):
+                names.update(os.path.splitext(f)[0] for f in os.listdir(path)
+                             if f.endswith(EXTENSIONS))
+        return sorted(names)
+
+    def is_colour(self, name):
+        return isinstance(self.get(name), ColourScheme)
+
+    def get(self, name):
+        if name not in self._compiled:
+            filename = self.find(name)
+            if filename is None:
+                if name in SCHEMES:
+                    return get_lut(name)
+                if name in ADAPTIVE_SCHEMES:
+                    self._compiled[name] = ADAPTIVE_SCHEMES[name]()
+                    return self._compiled[name]
+                raise KeyError('unknown enhancement scheme %r (available: %s)'
+                               % (name, ', '.join(self.names())))
+            self._compiled[name] = self._load(filename, name)
+        return self._compiled[name]
+
+    def _load(self, filename, name):
+        with open(filename, 'rb') as f:
+            digest = hashlib.sha256(_CACHE_VERSION + f.read()).hexdigest()[:16]
+        cached = None
+        if self.cache_dir:
+            cached = os.path.join(self.cache_dir, '%s-%s.npz' % (name, digest))
+            if os.path.exists(cached):
+                try:
+                    with np.load(cached) as npz:
+                        return self._build(name, npz['lut'], npz.get('table'))
+                except (OSError, ValueError, KeyError):
+                    pass    # corrupted cache entry: compile again
+
+        kind, data = read_scheme(filename)
+        if kind == 'grey':
+            lut, table = lut_piecewise(*data), None
+        else:
+            lut, table = ColourScheme.compile(data, name), data
+
+        if cached:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp = cached + '.%d.tmp' % os.getpid()
+                with open(tmp, 'wb') as f:
+                    if table is None:
+                        np.savez(f, lut=lut)
+                    else:
+                        np.savez(f, lut=lut, table=table)
+                os.replace(tmp, cached)
+            except OSError as e:
+                warnings.warn('cannot cache the %s scheme: %s' % (name, e))
+        return self._build(name, lut, table)
+
+    @staticmethod
+    def _build(name, lut, table):
+        if table is None:
+            lut.flags.writeable = False
+            return lut
+        return ColourScheme(table, name, lut=lut)
+
+
+_registry = None
+
+
+def get_registry():
+    """Default registry of the repository schemes."""
+    global _registry
+    if _registry is None:
+        _registry = SchemeRegistry()
+    return _registry
+
+
+def get_scheme(name):
+    """Compiled scheme ``name`` from the default registry."""
+    return get_registry().get(name)
@@ -6,6 +6,8 @@
 # - code: https://unidata.github.io/MetPy/latest/tutorials/upperair_soundings.html#sphx-glr-tutorials-upperair-soundings-py
 
 # We use data of Hanoi (station 48820) from the Wyoming University database, using the Siphon package.
+# The soundings are kept in a local store (sounding_store.py): the server is only requested the first time,
+# and archived soundings can be imported for offline use (`python sounding_store.py --import 'archive/*.csv'`).
 
 # In[ ]:
 
@@ -18,7 +20,7 @@ from mpl_toolkits.axes_grid1.inset_locator import inset_axes
 from metpy.plots import SkewT
 from metpy.units import pandas_dataframe_to_unit_arrays, units
 import numpy as np
-from siphon.simplewebservice.wyoming import WyomingUpperAir
+from sounding_store import load_sounding
 
 import metpy.calc as mpcalc
 from metpy.cbook import get_test_data
@@ -27,8 +29,9 @@ from metpy.units import units
 
 dt = datetime(2017, 9, 25)
 station = '48820'
-# Read remote sounding data based on time (dt) and station
-df = WyomingUpperAir.request_data(dt, station)
+# Read sounding data based on time (dt) and station, from the local store
+# (fetched with WyomingUpperAir.request_data and stored on the first run)
+df = load_sounding(dt, station)
 
 # Create dictionary of united arrays
 data = pandas_dataframe_to_unit_arrays(df)
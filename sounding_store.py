@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Local store of upper-air soundings (Parquet, by station and date) in front of siphon.
+
+Example::
+
+    python sounding_store.py 48820 2017-09-25T00 2017-09-25T12
+    python sounding_store.py --import 'archive/*.csv'
+    python sounding_store.py 48820 2017-09-25T00 --fetcher 'http://mirror:8000/{station}_{time:%Y%m%d%H}.csv'
+
+skew_T.py requests the sounding from the Wyoming University server on every
+run (slow, rate limited, and impossible without network). ``load_sounding``
+reads it from the store when it is there, and otherwise fetches it once and
+stores it::
+
+    df = load_sounding(datetime(2017, 9, 25), '48820')
+
+The store holds one Parquet file per sounding,
+``<station>/<YYYY-MM-DD>/<HHMM>Z.parquet`` under ``SOUNDING_STORE`` (by
+default ``~/.cache/remote-sensing-atmosphere/soundings``), with the column
+units in the file metadata: the DataFrame comes back in the shape of
+``WyomingUpperAir.request_data`` (same columns, ``df.units``), ready for
+``pandas_dataframe_to_unit_arrays``.
+
+The fetcher is any function of (time, station) returning such a DataFrame:
+``wyoming`` (siphon, the default), ``FileFetcher`` for local CSV/Parquet files
+and ``HTTPFetcher`` for CSV files served over HTTP (an archive mirror on an
+air-gapped network, or ``python -m http.server`` in tests). ``None`` makes
+the store offline: a missing sounding is an error. Archived soundings (CSV or
+Parquet files of one or more soundings, with the ``station_number`` and
+``time`` columns) are bulk imported with ``import_soundings``.
+"""
+
+import argparse
+import glob
+import io
+import json
+import os
+import sys
+import warnings
+from datetime import datetime
+
+import pandas as pd
+
+from file_inputs import input_files
+
+STORE_DIR = os.environ.get('SOUNDING_STORE',
+                           os.path.join(os.path.expanduser('~'), '.cache',
+                                        'remote-sensing-atmosphere', 'soundings'))
+
+# Columns and units of siphon's WyomingUpperAir.request_data
+UNITS = {
+    'pressure': 'hPa',
+    'height': 'meter',
+    'temperature': 'degC',
+    'dewpoint': 'degC',
+    'direction': 'degrees',
+    'speed': 'knot',
+    'u_wind': 'knot',
+    'v_wind': 'knot',
+    'station': None,
+    'station_number': None,
+    'time': None,
+    'latitude': 'degrees',
+    'longitude': 'degrees',
+    'elevation': 'meter',
+    'pw': 'millimeter',
+}
+
+
+def sounding_time(time):
+    """datetime of a datetime, datetime64 or ISO string (2017-09-25T12)."""
+    return pd.Timestamp(time).to_pydatetime()
+
+
+def with_units(df, units=None):
+    """``df`` with the ``units`` attribute of siphon DataFrames."""
+    units = units or UNITS
+    with warnings.catch_warnings():
+        # pandas warns about attributes that look like columns
+        warnings.simplefilter('ignore', UserWarning)
+        df.units = dict((c, units.get(c)) for c in df.columns)
+    return df
+
+
+def read_csv(source, units=None):
+    """Sounding(s) of a CSV file, URL or file object (siphon column names)."""
+    df = pd.read_csv(source, dtype={'station': str})
+    if 'time' in df:
+        df['time'] = pd.to_datetime(df['time'])
+    return with_units(df, units)
+
+
+def read_parquet(filename):
+    """Sounding(s) of a Parquet file, with the units stored in its metadata."""
+    import pyarrow.parquet as pq
+    table = pq.read_table(filename)
+    meta = table.schema.metadata or {}
+    units = json.loads(meta[b'units']) if b'units' in meta else None
+    return with_units(table.to_pandas(), units)
+
+
+def read_file(filename):
+    """Sounding(s) of a CSV or Parquet file."""
+    if filename.lower().endswith(('.parquet', '.pq')):
+        return read_parquet(filename)
+    return read_csv(filename)
+
+
+def wyoming(time, station):
+    """Sounding of the Wyoming University server (siphon)."""
+    from siphon.simplewebservice.wyoming import WyomingUpperAir
+    return WyomingUpperAir.request_data(time, station)
+
+
+class FileFetcher(object):
+    """Soundings of local CSV or Parquet files, one per sounding, named from a
+    template of ``station`` and ``time``."""
+
+    def __init__(self, template='{station}_{time:%Y%m%d%H}.csv'):
+        self.template = template
+
+    def __call__(self, time, station):
+        filename = self.template.format(station=station, time=time)
+        if not os.path.exists(filename):
+            raise ValueError('No data available for %s for station %s (%s).'
+                             % (time, station, filename))
+        return read_file(filename)
+
+
+class HTTPFetcher(object):
+    """Soundings of CSV files served over HTTP, at a URL template of ``station``
+    and ``time``."""
+
+    def __init__(self, template, timeout=30.):
+        self.template = template
+        self.timeout = timeout
+
+    def __call__(self, time, station):
+        from urllib.error import HTTPError
+        from urllib.request import urlopen
+        url = self.template.format(station=station, time=time)
+        try:
+            with urlopen(url, timeout=self.timeout) as response:
+                content = response.read()
+        except HTTPError as e:
+            if e.code == 404:
+                raise ValueError('No data available for %s for station %s (%s).'
+                                 % (time, station, url))
+            raise
+        return read_csv(io.BytesIO(content))
+
+
+def fetcher(spec):
+    """Fetcher of a command-line spec: 'wyoming', 'none', an http(s) URL template
+    or a local file template."""
+    if spec == 'wyoming':
+        return wyoming
+    if spec == 'none':
+        return None
+    if spec.startswith(('http://', 'https://')):
+        return HTTPFetcher(spec)
+    return FileFetcher(spec)
+
+
+class SoundingStore(object):
+    """Soundings keyed by (station, time), fetched on a miss."""
+
+    def __init__(self, root=STORE_DIR, fetcher=wyoming):
+        self.root = root
+        self.fetcher = fetcher
+
+    def path(self, time, station):
+        time = sounding_time(time)
+        return os.path.join(self.root, str(station), time.strftime('%Y-%m-%d'),
+                            time.strftime('%H%MZ.parquet'))
+
+    def get(self, time, station):
+        """Stored sounding, or None."""
+        path = self.path(time, station)
+        if not os.path.exists(path):
+            return None
+        return read_parquet(path)
+
+    def put(self, df, time, station):
+        """Store one sounding (atomically); return its file name, or None on failure."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        path = self.path(time, station)
+        units = getattr(df, 'units', None) or UNITS
+        table = pa.Table.from_pandas(pd.DataFrame(df), preserve_index=False)
+        meta = dict(table.schema.metadata or {})
+        meta[b'units'] = json.dumps(dict((c, units.get(c)) for c in df.columns)).encode()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = '%s.%d.tmp' % (path, os.getpid())
+            pq.write_table(table.replace_schema_metadata(meta), tmp)
+            os.replace(tmp, path)
+        except OSError as e:
+            warnings.warn('cannot store the sounding of %s at %s: %s' % (station, time, e))
+            return None
+        return path
+
+    def load(self, time, station):
+        """Sounding of ``station`` at ``time``: stored, or fetched and stored."""
+        df = self.get(time, station)
+        if df is not None:
+            return df
+        if self.fetcher is None:
+            raise ValueError('no sounding of station %s at %s in %s (offline)'
+                             % (station, time, self.root))
+        df = self.fetcher(sounding_time(time), station)
+        self.put(df, time, station)
+        return df
+
+    def entries(self, station=None):
+        """(station, time) of the stored soundings, in order."""
+        entries = []
+        stations = [str(station)] if station is not None else \
+            (sorted(os.listdir(self.root)) if os.path.isdir(self.root) else [])
+        for st in stations:
+            for path in glob.glob(os.path.join(self.root, st, '*', '*Z.parquet')):
+                day = os.path.basename(os.path.dirname(path))
+                entries.append((st, datetime.strptime(day + os.path.basename(path)[:4],
+                                                      '%Y-%m-%d%H%M')))
+        return sorted(entries)
+
+
+def load_sounding(time, station, store=None):
+    """Sounding in the shape of ``WyomingUpperAir.request_data(time, station)``,
+    from the default store (fetched from Wyoming once)."""
+    return (store or SoundingStore()).load(time, station)
+
+
+def import_soundings(files, store=None):
+    """Store the soundings of archived CSV/Parquet files (grouped by
+    ``station_number`` and ``time``); return the number stored."""
+    store = store or SoundingStore(fetcher=None)
+    n = 0
+    for filename in files:
+        df = read_file(filename)
+        missing = set(('station_number', 'time')) - set(df.columns)
+        if missing:
+            raise ValueError('%s: no %s column' % (filename, ', '.join(sorted(missing))))
+        for (station, time), sounding in df.groupby(['station_number', 'time'], sort=True):
+            sounding = with_units(sounding.reset_index(drop=True), df.units)
+            if store.put(sounding, time, station) is not None:
+                n += 1
+    return n
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('station', nargs='?', help='station number (e.g. 48820)')
+    parser.add_argument('times', nargs='*', help='sounding times (e.g. 2017-09-25T12)')
+    parser.add_argument('--import', dest='archives', nargs='+', default=[],
+                        help='CSV/Parquet archives or glob patterns to import')
+    parser.add_argument('--fetcher', default='wyoming',
+                        help="'wyoming', 'none' (offline), an http(s) URL template or a file "
+                             "template of {station} and {time:...}")
+    parser.add_argument('--store', default=STORE_DIR)
+    args = parser.parse_args(argv)
+
+    store = SoundingStore(args.store, fetcher(args.fetcher))
+    if args.archives:
+        files = input_files(parser, args.archives)
+        print('%d sounding(s) imported from %d file(s)' % (import_soundings(files, store), len(files)))
+    for t in args.times:
+        try:
+            df = store.load(t, args.station)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            continue
+        print('%s %s: %d level(s)' % (args.station, sounding_time(t), len(df)))
+    if not args.times:
+        entries = store.entries(args.station)
+        for station, time in entries:
+            print('%s %s' % (station, time))
+        print('%s: %d sounding(s)' % (store.root, len(entries)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Storm-following windows from a best track (IBTrACS or JMA), for GRIDSAT-B1 and Himawari.
+
+Example::
+
+    python storm_track.py ibtracs.WP.list.v04r00.csv 'data_GRIDSAT/GRIDSAT-B1.2013.11.*.nc' \\
+        --storm 2013306N07162 -o haiyan_follow_ir.gif
+    python dvorak.py data_HIMAWARI -s BD --track bst_all.txt --storm 2317 -o bd.gif
+
+PRECIPITATIONS.py and CYCLONES.py read fixed regional boxes (lat 0-30 /
+lon 100-140, lon 80-140 / lat 20-45) when only a few hundred km around the
+centre matter. The best-track centre is interpolated (linearly, in time) to
+the time of every file or slot, and only the window of ``radius_km`` around it
+is read: GRIDSAT-B1 through index slices of the window (a fixed number of
+pixels, so that the frames of a loop have the same size), Himawari through the
+HSD segments of the window (dvorak.py ``--track``).
+
+Track files:
+
+- IBTrACS CSV (``SID``, ``NAME``, ``ISO_TIME``, ``LAT``, ``LON``; the units
+  row is skipped), or any CSV with time, lat and lon columns
+- JMA best track (``bst_all.txt``: ``66666`` header lines, then
+  ``YYMMDDHH 002 grade lat*10 lon*10 ...`` lines); ``--storm`` is the
+  international number (``1330`` for Haiyan) or the name
+"""
+
+import argparse
+import csv
+import os
+import re
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+from file_inputs import expand_inputs
+from gridsat import CLIMS, KM_PER_DEGREE, file_time, open_gridsat, variable_name
+
+_TIME_COLUMNS = ('iso_time', 'time', 'datetime', 'date')
+_LAT_COLUMNS = ('lat', 'latitude', 'usa_lat')
+_LON_COLUMNS = ('lon', 'longitude', 'usa_lon')
+
+_SLOT = re.compile(r'^(\d{12})$')
+
+
+class Track(object):
+    """Best-track centres of one storm, interpolated linearly in time."""
+
+    def __init__(self, times, lat, lon, name=None):
+        order = np.argsort(times)
+        self.times = np.asarray(times, 'datetime64[s]')[order]
+        self.lat = np.asarray(lat, 'float64')[order]
+        # Continuous longitudes across the date line
+        self.lon = np.degrees(np.unwrap(np.radians(np.asarray(lon, 'float64')[order])))
+        self.name = name
+        if len(self.times) == 0:
+            raise ValueError('empty track')
+
+    def centre(self, time):
+        """(lon, lat) of the centre at ``time`` (datetime or datetime64)."""
+        t = np.datetime64(time, 's')
+        if t < self.times[0] or t > self.times[-1]:
+            raise ValueError('%s outside the track (%s to %s)' % (t, self.times[0], self.times[-1]))
+        x = (self.times - self.times[0]).astype('float64')
+        tx = float((t - self.times[0]).astype('float64'))
+        lon = float(np.interp(tx, x, self.lon))
+        return (lon + 180.) % 360. - 180., float(np.interp(tx, x, self.lat))
+
+
+def _column(header, names):
+    lower = [h.strip().lower() for h in header]
+    for name in names:
+        if name in lower:
+            return lower.index(name)
+    raise ValueError('no %s column in %s' % ('/'.join(names), ', '.join(header)))
+
+
+def _matches(row, header, storm):
+    for col in ('SID', 'NAME', 'NUMBER'):
+        if col in header and row[header.index(col)].strip().upper() == storm.upper():
+            return True
+    return False
+
+
+def read_csv_track(filename, storm=None):
+    """Track of an IBTrACS (or time, lat, lon) CSV file."""
+    with open(filename, 'r', newline='') as f:
+        reader = csv.reader(f)
+        header = [h.strip() for h in next(reader)]
+        it, ilat, ilon = (_column(header, names) for names in (_TIME_COLUMNS, _LAT_COLUMNS, _LON_COLUMNS))
+        times, lat, lon, sids = [], [], [], set()
+        for row in reader:
+            if not row or (storm and not _matches(row, header, storm)):
+                continue
+            try:
+                y, x = float(row[ilat]), float(row[ilon])
+            except ValueError:
+                continue    # units row of IBTrACS, missing positions
+            times.append(np.datetime64(row[it].strip().replace(' ', 'T'), 's'))
+            lat.append(y)
+            lon.append(x)
+            if 'SID' in header:
+                sids.add(row[header.index('SID')])
+    if len(sids) > 1:
+        raise ValueError('%s: %d storms (%s), select one with its SID'
+                         % (filename, len(sids), ', '.join(sorted(sids))))
+    return Track(times, lat, lon, storm)
+
+
+def read_jma_track(filename, storm=None):
+    """Track of a JMA best-track file (one storm selected by number or name)."""
+    times, lat, lon = [], [], []
+    keep = False
+    selected = set()
+    with open(filename, 'r') as f:
+        for line in f:
+            fields = line.split()
+            if not fields:
+                continue
+            if fields[0] == '66666':
+                name = fields[7] if len(fields) > 7 else ''
+                keep = storm is None or storm.upper() in (fields[1], name.upper())
+                if keep:
+                    selected.add(fields[1])
+                continue
+            if keep and len(fields) >= 5 and fields[1] == '002':
+                yy = int(fields[0][:2])
+                stamp = '%d-%s-%sT%s' % (yy + (1900 if yy > 50 else 2000),
+                                         fields[0][2:4], fields[0][4:6], fields[0][6:8])
+                times.append(np.datetime64(stamp + ':00', 's'))
+                lat.append(int(fields[3])/10.)
+                lon.append(int(fields[4])/10.)
+    if len(selected) > 1:
+        raise ValueError('%s: %d storms (%s), select one with its number'
+                         % (filename, len(selected), ', '.join(sorted(selected))))
+    return Track(times, lat, lon, storm)
+
+
+def read_track(filename, storm=None):
+    """Track of a best-track file (IBTrACS/generic CSV or JMA)."""
+    with open(filename, 'r') as f:
+        first = f.readline()
+    if first.startswith('66666'):
+        return read_jma_track(filename, storm)
+    return read_csv_track(filename, storm)
+
+
+def slot_time(path):
+    """Time of a YYYYMMDDHHMM Himawari slot folder."""
+    m = _SLOT.match(os.path.basename(os.path.normpath(path)))
+    if m is None:
+        raise ValueError('%s: not a YYYYMMDDHHMM slot folder' % path)
+    return datetime.strptime(m.group(1), '%Y%m%d%H%M')
+
+
+def slot_centre(track):
+    """Function of a slot folder returning the (lon, lat) centre of ``track``,
+    or None for slots outside the track (dvorak.iter_frames)."""
+    def centre(path):
+        try:
+            return track.centre(slot_time(path))
+        except ValueError:
+            return None
+    return centre
+
+
+def window_slices(coord, centre, half):
+    """Index slice of ``2*half + 1`` points of a 1-D coordinate around ``centre``
+    (shifted inside the coordinate at the edges)."""
+    coord = np.asarray(coord)
+    i = int(np.abs(coord - centre).argmin())
+    i0 = min(max(i - half, 0), max(len(coord) - 2*half - 1, 0))
+    return slice(i0, i0 + 2*half + 1)
+
+
+def gridsat_window(filename, track, radius_km=500., var='ir', half=None):
+    """Storm-centred window of one GRIDSAT-B1 file (DataArray), read alone.
+
+    ``half`` is the (lat, lon) half-size in pixels; by default ``radius_km``
+    at the latitude of the centre.
+    """
+    lon, lat = track.centre(file_time(filename))
+    with open_gridsat(filename) as ds:
+        lats, lons = ds['lat'].values, ds['lon'].values
+        if half is None:
+            res = abs(float(lats[1]) - float(lats[0]))
+            half = (int(np.ceil(radius_km/(res*KM_PER_DEGREE))),
+                    int(np.ceil(radius_km/(res*KM_PER_DEGREE*max(np.cos(np.radians(lat)), 0.01)))))
+        return ds[variable_name(var)].isel(lat=window_slices(lats, lat, half[0]),
+                                           lon=window_slices(lons, lon, half[1])).load()
+
+
+def iter_gridsat(files, track, radius_km=500., var='ir'):
+    """Storm-centred windows of ``files`` with the time of each file within the
+    track, all of the pixel size of the first one."""
+    half = None
+    for f in files:
+        try:
+            track.centre(file_time(f))
+        except ValueError:
+            continue
+        dat = gridsat_window(f, track, radius_km, var, half)
+        if half is None:
+            half = (dat.sizes['lat']//2, dat.sizes['lon']//2)
+        yield f, dat
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('track', help='IBTrACS/generic CSV or JMA best-track file')
+    parser.add_argument('inputs', nargs='*', help='GRIDSAT-B1 files or glob patterns')
+    parser.add_argument('--storm', help='SID, name or JMA number of the storm')
+    parser.add_argument('--radius-km', type=float, default=500.)
+    parser.add_argument('-v', '--var', default='ir', help="channel: 'ir', 'wv' or 'vis'")
+    parser.add_argument('-o', '--output', help='.gif/.mp4 loop (default: print the centres)')
+    parser.add_argument('--cmap', default='rainbow')
+    parser.add_argument('--clim', type=float, nargs=2, help='colour range')
+    parser.add_argument('--duration', type=float, default=200, help='ms per frame')
+    args = parser.parse_args(argv)
+
+    try:
+        track = read_track(args.track, args.storm)
+    except ValueError as e:
+        parser.error(e.args[0])
+    files = expand_inputs(args.inputs)
+    if not args.output:
+        for f in files:
+            t = file_time(f)
+            try:
+                print('%s %s %.2f %.2f' % (os.path.basename(f), t, *track.centre(t)))
+            except ValueError:
+                print('%s %s outside the track' % (os.path.basename(f), t))
+        return 0
+    if not files:
+        parser.error('no input matches %s' % ' '.join(args.inputs))
+
+    from enhance_sequence import open_writer
+    from raster_output import ColormapLUT
+    colormap = ColormapLUT(args.cmap, *(args.clim or CLIMS[args.var]))
+    t0 = time.perf_counter()
+    with open_writer(args.output, args.duration) as writer:
+        for _, dat in iter_gridsat(files, track, args.radius_km, args.var):
+            data = np.squeeze(dat.values)
+            if dat.lat.values[0] < dat.lat.values[-1]:
+                data = data[::-1]   # north up
+            writer.append(colormap(data))
+        n = writer.nframes
+    dt = time.perf_counter() - t0
+    print('%s: %d frame(s) in %.2f s (%.1f frames/s)' % (args.output, n, dt, n/dt if dt else 0.))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
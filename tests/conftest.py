@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Compiled scheme tables go to a scratch directory, not ~/.cache
+os.environ.setdefault('ENHANCEMENT_CACHE_DIR', tempfile.mkdtemp(prefix='enhancement-cache-'))
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from block_stats import (block_fraction, block_mean, block_mean_coord, block_sum,
+                         sliding_fraction)
+
+
+def tb_field(shape, seed=0):
+    rng = np.random.default_rng(seed)
+    tb = rng.uniform(190., 300., shape)
+    tb[rng.random(shape) < 0.1] = np.nan
+    return tb
+
+
+def brute_block_fraction(tb, n, m, threshold=235., partial=True):
+    rows = range(0, tb.shape[0], n) if partial else range(0, tb.shape[0] - n + 1, n)
+    cols = range(0, tb.shape[1], m) if partial else range(0, tb.shape[1] - m + 1, m)
+    out = np.full((len(rows), len(cols)), np.nan)
+    for i, r in enumerate(rows):
+        for j, c in enumerate(cols):
+            block = tb[r:r+n, c:c+m]
+            valid = block[np.isfinite(block)]
+            if valid.size:
+                out[i, j] = np.count_nonzero(valid < threshold)/valid.size
+    return out
+
+
+def brute_sliding_fraction(tb, h, w, threshold=235.):
+    out = np.full(tb.shape, np.nan)
+    for r in range(tb.shape[0]):
+        for c in range(tb.shape[1]):
+            window = tb[max(r - h//2, 0):r - h//2 + h, max(c - w//2, 0):c - w//2 + w]
+            valid = window[np.isfinite(window)]
+            if valid.size:
+                out[r, c] = np.count_nonzero(valid < threshold)/valid.size
+    return out
+
+
+@pytest.mark.parametrize('shape', [(40, 60), (43, 67), (3, 12), (5, 5)])
+@pytest.mark.parametrize('n, m', [(5, 5), (4, 7), (8, 3)])
+@pytest.mark.parametrize('partial', [True, False])
+def test_block_fraction_matches_brute_force(shape, n, m, partial):
+    tb = tb_field(shape)
+    expected = brute_block_fraction(tb, n, m, partial=partial)
+    np.testing.assert_allclose(block_fraction(tb, n, m, partial=partial), expected)
+
+
+def test_block_sum_of_partial_blocks():
+    a = np.arange(7*11).reshape(7, 11)
+    expected = [[a[r:r+3, c:c+4].sum() for c in range(0, 11, 4)] for r in range(0, 7, 3)]
+    assert np.array_equal(block_sum(a, 3, 4), expected)
+    assert np.array_equal(block_sum(a, 3, 4, partial=False), np.array(expected)[:2, :2])
+
+
+def test_block_mean_and_coords():
+    values = tb_field((10, 9))
+    expected = [[np.nanmean(values[r:r+4, c:c+4]) for c in range(0, 9, 4)] for r in range(0, 10, 4)]
+    np.testing.assert_allclose(block_mean(values, 4), expected)
+    assert np.allclose(block_mean_coord(np.arange(10.), 4), [1.5, 5.5, 8.5])
+    assert np.allclose(block_mean_coord(np.arange(10.), 4, partial=False), [1.5, 5.5])
+
+
+@pytest.mark.parametrize('size', [3, 4, (5, 2)])
+def test_sliding_fraction_matches_brute_force(size):
+    tb = tb_field((17, 23), seed=1)
+    h, w = (size, size) if np.isscalar(size) else size
+    np.testing.assert_allclose(sliding_fraction(tb, size), brute_sliding_fraction(tb, h, w))
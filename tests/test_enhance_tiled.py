@@ -0,0 +1,49 @@
+import os
+
+import numpy as np
+import pytest
+
+from enhance_tiled import enhance_tiled
+from enhancement import ColourScheme, apply_lut, load_image
+from histogram_enhancement import AdaptiveScheme
+from scheme_registry import get_registry
+
+IMAGE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                     'data', 'se1_b03_0410.jpg')
+
+BD_TABLE = [[0, 109, 0, 255, 0, 255, 0, 255],
+            [109, 160, 90, 90, 255, 0, 0, 255],
+            [160, 255, 255, 255, 255, 255, 255, 255]]
+
+
+def whole_image(rgb, lut):
+    """Enhancement of the whole decoded image (green channel for the grey schemes)."""
+    if isinstance(lut, ColourScheme):
+        return lut.apply(rgb)
+    if isinstance(lut, AdaptiveScheme):
+        return lut.apply(rgb[..., 1])
+    return apply_lut(rgb[..., 1], lut)
+
+
+def test_load_image_is_row_major():
+    rgb = load_image(IMAGE)
+    green = load_image(IMAGE, channels=1)
+    assert rgb.ndim == 3 and rgb.shape[2] == 3
+    assert green.shape == rgb.shape[:2]
+    assert np.array_equal(green, rgb[..., 1])
+    # Channel selections are views of the decoded image, not copies
+    assert not green.flags['OWNDATA']
+    assert not load_image(IMAGE, channels=[0, 1]).flags['OWNDATA']
+
+
+@pytest.mark.parametrize('scheme', ['ZA', 'ln_up', 'HE', 'CLAHE', 'BD'])
+@pytest.mark.parametrize('tiles', [(97, 131), (1024, None)])
+def test_tiled_matches_whole_image(tmp_path, scheme, tiles):
+    rgb = load_image(IMAGE)
+    lut = ColourScheme(BD_TABLE) if scheme == 'BD' else get_registry().get(scheme)
+    src, dst = str(tmp_path/'in.npy'), str(tmp_path/'out.npy')
+    np.save(src, rgb)
+    shape = enhance_tiled(src, dst, lut, tile_rows=tiles[0], tile_cols=tiles[1])
+    out = np.load(dst)
+    assert out.shape == shape
+    assert np.array_equal(out, whole_image(rgb, lut))
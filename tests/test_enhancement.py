@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from bench_enhancement import SYNTHETIC_BD, legacy_bd, legacy_linear, legacy_piecewise, legacy_shift
+from enhancement import ColourScheme, apply_lut, get_lut, linear_reg
+from scheme_registry import get_registry, read_scheme
+
+
+def grey_image():
+    # Every count once, then random ones; [x, y] axes as the per-pixel loops
+    rng = np.random.default_rng(0)
+    counts = np.concatenate([np.arange(256), rng.integers(0, 256, 768)])
+    return counts.astype('uint8').reshape(32, 32)
+
+
+@pytest.mark.parametrize('name, offset', [('ln_up', 50), ('ln_dn', -50)])
+def test_shift_matches_legacy(name, offset):
+    img = grey_image()
+    assert np.array_equal(apply_lut(img, get_lut(name)), legacy_shift(img, offset))
+
+
+@pytest.mark.parametrize('name, line', [('more_contrast', (75, 100, 0, 255)),
+                                        ('less_contrast', (0, 255, 75, 100))])
+def test_linear_matches_legacy(name, line):
+    img = grey_image()
+    assert np.array_equal(apply_lut(img, get_lut(name)), legacy_linear(img, *linear_reg(*line)))
+
+
+@pytest.mark.parametrize('name', ['ZA', 'MB'])
+def test_scheme_file_matches_legacy(name):
+    img = grey_image()
+    x, y = read_scheme(get_registry().find(name))[1]
+    assert np.array_equal(apply_lut(img, get_registry().get(name)),
+                          legacy_piecewise(img, list(x), list(y)))
+
+
+def test_apply_lut_keeps_shape():
+    img = grey_image()[:, :, None].repeat(3, axis=2)
+    out = apply_lut(img, get_lut('ln_up'))
+    assert out.shape == img.shape and out.dtype == np.uint8
+    with pytest.raises(TypeError):
+        apply_lut(img.astype('int16'), get_lut('ln_up'))
+
+
+# Dvorak BD segments (x1 x2 yb1 yb2 yg1 yg2 yr1 yr2), with flat and sloped parts
+BD_TABLE = [[0, 30, 0, 60, 0, 60, 0, 60],
+            [30, 109, 60, 255, 60, 255, 60, 255],
+            [109, 140, 90, 90, 90, 90, 90, 90],
+            [140, 160, 255, 255, 0, 0, 0, 0],
+            [160, 190, 0, 255, 0, 255, 255, 0],
+            [190, 255, 255, 255, 255, 255, 255, 255]]
+
+
+@pytest.mark.parametrize('table', [SYNTHETIC_BD, BD_TABLE])
+def test_colour_scheme_matches_legacy(table):
+    rng = np.random.default_rng(1)
+    rgb = rng.integers(0, 256, (24, 32, 3)).astype('uint8')
+    rgb[0, :, 1] = np.arange(32)*8      # selectors across the segments
+    expected = np.swapaxes(legacy_bd(np.swapaxes(rgb, 0, 1), np.array(table)), 0, 1)
+    assert np.array_equal(ColourScheme(table).apply(rgb), expected)
+
+
+def test_colour_scheme_palette_of_grey_counts():
+    scheme = ColourScheme(BD_TABLE)
+    grey = grey_image()
+    pic = np.repeat(grey[..., None], 3, axis=2)
+    expected = np.swapaxes(legacy_bd(pic, np.array(BD_TABLE)), 0, 1)
+    assert np.array_equal(scheme.apply(grey.T), expected)
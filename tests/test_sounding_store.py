@@ -0,0 +1,109 @@
+import functools
+import threading
+from datetime import datetime
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+import pytest
+
+from sounding_store import UNITS, FileFetcher, HTTPFetcher, SoundingStore, import_soundings
+
+TIME = datetime(2017, 9, 25, 12)
+STATION = '48820'
+
+
+def sounding(time=TIME, station=STATION, levels=4):
+    """Sounding in the shape of siphon's WyomingUpperAir.request_data."""
+    return pd.DataFrame({
+        'pressure': [1000., 925., 850., 700.][:levels],
+        'height': [110., 780., 1500., 3100.][:levels],
+        'temperature': [27.2, 22.4, 18.0, 9.6][:levels],
+        'dewpoint': [24.1, 19.3, 13.0, -0.4][:levels],
+        'direction': [90., 110., 135., 180.][:levels],
+        'speed': [5., 12., 15., 20.][:levels],
+        'u_wind': [-5., -11.3, -10.6, 0.][:levels],
+        'v_wind': [0., 4.1, 10.6, 20.][:levels],
+        'station': ['VVNB']*levels,
+        'station_number': [int(station)]*levels,
+        'time': [pd.Timestamp(time)]*levels,
+        'latitude': [21.02]*levels,
+        'longitude': [105.8]*levels,
+        'elevation': [6.]*levels,
+        'pw': [58.3]*levels,
+    })
+
+
+def assert_same_sounding(df, expected):
+    pd.testing.assert_frame_equal(df.reset_index(drop=True), expected, check_dtype=False)
+    assert df.units == dict((c, UNITS[c]) for c in expected.columns)
+
+
+@pytest.fixture
+def archive(tmp_path):
+    """Directory of one CSV file per sounding, named {station}_{time:%Y%m%d%H}.csv."""
+    path = tmp_path/'archive'
+    path.mkdir()
+    sounding().to_csv(path/('%s_%s.csv' % (STATION, TIME.strftime('%Y%m%d%H'))), index=False)
+    return path
+
+
+@pytest.fixture
+def http_server(archive):
+    handler = functools.partial(SimpleHTTPRequestHandler, directory=str(archive))
+    handler.log_message = lambda *args: None
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:%d' % server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+def test_file_fetcher_round_trip(tmp_path, archive):
+    fetcher = FileFetcher(str(archive/'{station}_{time:%Y%m%d%H}.csv'))
+    store = SoundingStore(str(tmp_path/'store'), fetcher)
+    assert store.get(TIME, STATION) is None
+    assert_same_sounding(store.load(TIME, STATION), sounding())
+    assert store.entries() == [(STATION, TIME)]
+    # Stored: read back offline, with the units of the file metadata
+    offline = SoundingStore(str(tmp_path/'store'), fetcher=None)
+    assert_same_sounding(offline.load('2017-09-25T12', STATION), sounding())
+
+
+def test_missing_sounding(tmp_path, archive):
+    store = SoundingStore(str(tmp_path/'store'), FileFetcher(str(archive/'{station}.csv')))
+    with pytest.raises(ValueError):
+        store.load(TIME, STATION)
+    with pytest.raises(ValueError):
+        SoundingStore(str(tmp_path/'store'), fetcher=None).load(TIME, STATION)
+
+
+def test_http_fetcher_round_trip(tmp_path, http_server):
+    fetcher = HTTPFetcher(http_server + '/{station}_{time:%Y%m%d%H}.csv', timeout=10.)
+    store = SoundingStore(str(tmp_path/'store'), fetcher)
+    assert_same_sounding(store.load(TIME, STATION), sounding())
+    assert_same_sounding(SoundingStore(str(tmp_path/'store'), None).load(TIME, STATION),
+                         sounding())
+    with pytest.raises(ValueError):
+        fetcher(datetime(2017, 9, 26), STATION)    # 404
+
+
+def test_import_soundings(tmp_path):
+    times = [TIME, datetime(2017, 9, 26)]
+    csv = tmp_path/'archive.csv'
+    pd.concat([sounding(t, levels=3) for t in times]).to_csv(csv, index=False)
+    parquet = tmp_path/'archive.parquet'
+    sounding(station='48900').to_parquet(parquet, index=False)
+    store = SoundingStore(str(tmp_path/'store'), fetcher=None)
+    assert import_soundings([str(csv), str(parquet)], store) == 3
+    assert store.entries() == [('48820', times[0]), ('48820', times[1]), ('48900', TIME)]
+    for t in times:
+        assert_same_sounding(store.load(t, STATION), sounding(t, levels=3))
+    assert_same_sounding(store.load(TIME, 48900), sounding(station='48900'))
+
+
+def test_import_needs_station_and_time(tmp_path):
+    csv = tmp_path/'bad.csv'
+    sounding().drop(columns='time').to_csv(csv, index=False)
+    with pytest.raises(ValueError):
+        import_soundings([str(csv)], SoundingStore(str(tmp_path/'store'), fetcher=None))